@@ -2,6 +2,8 @@
 ASGI config for aimesite project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Le flux Server-Sent Events de la carte (main.live) est servi ici, hors de
+Django, afin qu'une connexion longue n'occupe pas de worker WSGI.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'aimesite.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from main.live import STREAM_PATH, impact_stream_app  # noqa: E402 (après le setup Django)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+        await impact_stream_app(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
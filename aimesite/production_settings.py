@@ -115,11 +115,12 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 WHITENOISE_USE_FINDERS = True
 WHITENOISE_AUTOREFRESH = True
 
-# Configuration de cache (optionnel)
+# Configuration de cache (statistiques, tuiles de la carte...)
+# La table est créée par la migration main.0019_create_cache_table (migrate)
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
-        'location': 'cache_table',
+        'LOCATION': 'cache_table',
     }
 }
 
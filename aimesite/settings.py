@@ -77,6 +77,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'main.context_processors.unread_notifications',
             ],
         },
     },
@@ -96,6 +97,30 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Durée de fraîcheur (secondes) des statistiques de la page d'accueil ;
+# une valeur périmée reste servie pendant son rafraîchissement en arrière-plan
+SITE_STATISTICS_CACHE_TTL = 300
+
+# Durée de vie (secondes) de l'instantané du tableau de bord d'un utilisateur
+# (invalidé de toute façon à chacune de ses écritures) et des prochains
+# événements et challenges, communs à tous les tableaux de bord
+DASHBOARD_CACHE_TTL = 600
+DASHBOARD_UPCOMING_CACHE_TTL = 60
+
+# Durée de vie (secondes) du nombre de notifications non lues en cache
+# (supprimé à chaque modification du compteur)
+UNREAD_NOTIFICATIONS_CACHE_TTL = 300
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
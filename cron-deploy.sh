@@ -33,6 +33,9 @@ if [ "$(git rev-parse HEAD)" != "$(git rev-parse origin/main)" ]; then
     # Appliquer les migrations
     python3 manage.py migrate --noinput >> $LOG_FILE 2>&1
     
+    # Installer les tâches planifiées (outbox, classements, badges, diffusions)
+    bash install-cron.sh $SITE_PATH "$(command -v python3)" >> $LOG_FILE 2>&1
+    
     # Redémarrer l'application
     touch tmp/restart.txt
     
@@ -23,6 +23,9 @@ ssh $REMOTE_USER@$REMOTE_HOST << 'ENDSSH'
     # Appliquer les migrations
     python3 manage.py migrate --noinput
     
+    # Installer les tâches planifiées (outbox, classements, badges, diffusions)
+    bash install-cron.sh "$(pwd)" "$(command -v python3)"
+    
     # Redémarrer l'application
     touch tmp/restart.txt
     
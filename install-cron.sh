@@ -0,0 +1,35 @@
+#!/bin/bash
+# Installe (ou met à jour) les tâches planifiées du site dans la crontab.
+# Appelé par les scripts de déploiement ; peut être relancé sans risque :
+# le bloc délimité par les marqueurs est remplacé à chaque exécution.
+#
+# Usage : ./install-cron.sh [chemin_du_site] [python]
+
+SITE_PATH="${1:-/home/cp2639565p41/aime-rdc}"
+PYTHON="${2:-/home/cp2639565p41/virtualenv/aime-rdc.org/3.9/bin/python}"
+LOG_FILE="/home/cp2639565p41/cron-jobs.log"
+
+BEGIN_MARKER="# >>> aime-rdc tâches planifiées >>>"
+END_MARKER="# <<< aime-rdc tâches planifiées <<<"
+
+# flock -n : un passage encore en cours de la même commande n'est pas doublé
+# Usage : job 'planification' commande [options]
+job() {
+    echo "$1 cd $SITE_PATH && flock -n /tmp/aime-$2.lock $PYTHON manage.py $2${3:+ $3} >> $LOG_FILE 2>&1"
+}
+
+BLOCK="$BEGIN_MARKER
+$(job '* * * * *' drain_impact_outbox)
+$(job '* * * * *' send_broadcasts)
+$(job '*/5 * * * *' award_badges)
+$(job '17 4 * * *' award_badges --full)
+$(job '*/10 * * * *' rollup_points)
+$(job '0 * * * *' refresh_leaderboard)
+$(job '30 3 * * *' link_user_accounts)
+$END_MARKER"
+
+# Conserver les autres lignes de la crontab, remplacer notre bloc
+CURRENT=$(crontab -l 2>/dev/null | sed "/^$BEGIN_MARKER$/,/^$END_MARKER$/d")
+printf '%s\n%s\n' "$CURRENT" "$BLOCK" | sed '/./,$!d' | crontab -
+
+echo "✅ Tâches planifiées installées pour $SITE_PATH"
@@ -2,8 +2,11 @@ from django.contrib import admin
 from .models import (
     UserProfile, Category, Project, MutotoBikeChallenge, MBCParticipant,
     MutoScienceAdventure, Event, Donation, ContactMessage, 
-    NewsletterSubscription, UserActivity, Staff
+    NewsletterSubscription, UserActivity, Staff, EventParticipation, UserBadge,
+    NotificationBroadcast
 )
+from django.db import transaction
+from .broadcasts import queue_broadcast
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
@@ -34,6 +37,7 @@ class MBCParticipantAdmin(admin.ModelAdmin):
     list_display = ['participant_name', 'age', 'event', 'status', 'registered_at']
     list_filter = ['status', 'event']
     search_fields = ['participant_name', 'participant_email']
+    raw_id_fields = ['user']
 
 @admin.register(MutoScienceAdventure)
 class MutoScienceAdventureAdmin(admin.ModelAdmin):
@@ -53,6 +57,67 @@ class DonationAdmin(admin.ModelAdmin):
     list_display = ['donor_name', 'amount', 'currency', 'status', 'created_at']
     list_filter = ['status', 'currency']
     search_fields = ['donor_name', 'donor_email']
+    raw_id_fields = ['user']
+
+@admin.register(EventParticipation)
+class EventParticipationAdmin(admin.ModelAdmin):
+    list_display = ['user', 'event', 'status', 'registration_date']
+    list_filter = ['status', 'event']
+    search_fields = ['user__username', 'event__title']
+    actions = ['check_in']
+
+    # Points attribués à la présence effective à un événement
+    CHECK_IN_POINTS = 50
+
+    @admin.action(description="Pointer la présence (statut « Présent » et points)")
+    def check_in(self, request, queryset):
+        participations = list(queryset.exclude(status='attended'))
+        with transaction.atomic():
+            for participation in participations:
+                # save() : statistiques et carte d'impact suivent le changement de statut
+                participation.status = 'attended'
+                participation.save(update_fields=['status'])
+            UserProfile.award_points([p.user_id for p in participations], self.CHECK_IN_POINTS, reason='event_check_in')
+        self.message_user(request, f"{len(participations)} présence(s) pointée(s), +{self.CHECK_IN_POINTS} points chacune.")
+
+@admin.register(UserBadge)
+class UserBadgeAdmin(admin.ModelAdmin):
+    list_display = ['user', 'badge', 'awarded_at']
+    list_filter = ['badge']
+    search_fields = ['user__username', 'user__email']
+
+@admin.register(NotificationBroadcast)
+class NotificationBroadcastAdmin(admin.ModelAdmin):
+    list_display = ['title', 'role', 'language', 'newsletter_only', 'status', 'sent_count', 'total_recipients', 'progress', 'created_at']
+    list_filter = ['status', 'role', 'language']
+    search_fields = ['title', 'message']
+    readonly_fields = ['status', 'total_recipients', 'sent_count', 'last_user_id', 'created_by', 'started_at', 'finished_at']
+    # Figés dès la mise en file : segment et contenu de l'envoi en cours
+    QUEUED_READONLY_FIELDS = ['title', 'message', 'notification_type', 'link_url', 'role', 'language', 'newsletter_only']
+    actions = ['queue']
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None and obj.status != 'draft':
+            return self.QUEUED_READONLY_FIELDS + self.readonly_fields
+        return self.readonly_fields
+
+    @admin.display(description='Avancement (%)')
+    def progress(self, obj):
+        return obj.progress
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+            super().save_model(request, obj, form, change)
+        elif form.changed_data:
+            # Champs modifiés seulement : ne pas réécrire le statut ni
+            # l'avancement tenus à jour par send_broadcast
+            obj.save(update_fields=form.changed_data)
+
+    @admin.action(description="Mettre en file d'envoi (commande send_broadcasts)")
+    def queue(self, request, queryset):
+        queued = sum(queue_broadcast(broadcast) for broadcast in queryset.filter(status='draft'))
+        self.message_user(request, f"{queued} diffusion(s) mise(s) en file d'envoi.")
 
 @admin.register(ContactMessage)
 class ContactMessageAdmin(admin.ModelAdmin):
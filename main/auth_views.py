@@ -3,7 +3,7 @@ from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
 from django.contrib.auth.models import User
-from .models import UserProfile, UserActivity, UserNotification
+from django.db import transaction
 
 class SignUpForm(UserCreationForm):
     class Meta:
@@ -27,35 +27,10 @@ def signup_view(request):
     if request.method == 'POST':
         form = SignUpForm(request.POST)
         if form.is_valid():
-            user = form.save()
-            
-            # Créer le profil utilisateur
-            profile, created = UserProfile.objects.get_or_create(
-                user=user,
-                defaults={
-                    'role': 'member',
-                    'points': 50,  # Points de bienvenue
-                    'level': 1,
-                }
-            )
-            
-            # Ajouter badge de bienvenue
-            profile.add_badge('new_member')
-            
-            # Enregistrer l'activité
-            UserActivity.objects.create(
-                user=user,
-                activity_type='registration',
-                description='Inscription sur la plateforme AIME'
-            )
-            
-            # Notification de bienvenue
-            UserNotification.objects.create(
-                user=user,
-                title='Bienvenue chez AIME !',
-                message='Merci de rejoindre notre communauté. Découvrez votre tableau de bord et nos projets.',
-                notification_type='success'
-            )
+            # Le profil, l'activité et la notification de bienvenue sont créés
+            # par onboard_user (signal post_save), dans la même transaction
+            with transaction.atomic():
+                user = form.save()
             
             # Connexion automatique
             login(request, user)
@@ -0,0 +1,178 @@
+"""
+Attribution des badges par règles déclaratives, évaluées en lot : une
+requête ensembliste par règle, limitée aux utilisateurs inscrits dans la
+file BadgeCheck (don passé à « complété », activité enregistrée).
+
+La file est écrite par post_save, après l'écriture de la source : elle
+n'est validée avec celle-ci que si la source est enregistrée dans
+`transaction.atomic()` (vue de don, inscription à un événement,
+onboarding, admin). Un don complété longtemps après sa création, ou une
+ligne validée après le début d'un passage, est pris en compte au passage
+suivant ; un passage `--full` quotidien (install-cron.sh) rattrape une
+ligne de file perdue par une écriture faite hors transaction.
+"""
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .dashboard_cache import invalidate_dashboards
+from .models import BadgeCheck, Donation, UserActivity, UserBadge, UserNotification, UserProfile
+from .notifications import adjust_unread_count
+
+# Utilisateurs réévalués par transaction
+BADGE_CHECK_BATCH_SIZE = 1000
+
+# Catalogue des badges affichés dans le tableau de bord
+BADGE_CATALOGUE = {
+    'first_donation': {
+        'name': 'Premier Don',
+        'description': 'Effectué votre premier don',
+        'icon': 'fas fa-heart',
+        'color': 'text-danger'
+    },
+    'generous_donor': {
+        'name': 'Donateur Généreux',
+        'description': 'Plus de 5 donations',
+        'icon': 'fas fa-hand-holding-heart',
+        'color': 'text-success'
+    },
+    'event_participant': {
+        'name': 'Participant Actif',
+        'description': 'Participé à un événement',
+        'icon': 'fas fa-calendar-check',
+        'color': 'text-primary'
+    },
+    'bike_challenger': {
+        'name': 'Cycliste AIME',
+        'description': 'Participé au Mutoto Bike Challenge',
+        'icon': 'fas fa-bicycle',
+        'color': 'text-warning'
+    },
+    'volunteer': {
+        'name': 'Bénévole',
+        'description': 'Inscrit comme bénévole',
+        'icon': 'fas fa-hands-helping',
+        'color': 'text-info'
+    },
+    'level_5': {
+        'name': 'Expert AIME',
+        'description': 'Atteint le niveau 5',
+        'icon': 'fas fa-star',
+        'color': 'text-warning'
+    }
+}
+
+# Règles d'attribution. Sources :
+# - 'donation' : au moins `min_count` dons complétés rattachés au compte ;
+# - 'activity' : au moins `min_count` UserActivity des types listés ;
+# - 'profile' : profils vérifiant `filter` (réévalué à chaque passage).
+# bike_challenger est attribué directement à l'inscription au challenge.
+BADGE_RULES = [
+    {'badge': 'first_donation', 'source': 'donation', 'min_count': 1},
+    {'badge': 'generous_donor', 'source': 'donation', 'min_count': 6},
+    {'badge': 'event_participant', 'source': 'activity', 'activity_types': ['event_participation'], 'min_count': 1},
+    {'badge': 'volunteer', 'source': 'profile', 'filter': Q(role='volunteer')},
+    {'badge': 'level_5', 'source': 'profile', 'filter': Q(points__gte=2500)},  # Seuil du niveau 5
+]
+
+
+# Types d'activité pris en compte par au moins une règle
+ACTIVITY_TYPES = {
+    activity_type for rule in BADGE_RULES if rule['source'] == 'activity' for activity_type in rule['activity_types']
+}
+
+
+def queue_checks(user_ids):
+    """Réévaluer les badges des utilisateurs `user_ids` au prochain passage"""
+    BadgeCheck.objects.bulk_create([BadgeCheck(user_id=user_id) for user_id in set(user_ids) if user_id], batch_size=1000)
+
+
+def _donation_candidates(rule, user_ids):
+    donations = Donation.objects.filter(status='completed', user__isnull=False)
+    if user_ids is not None:
+        donations = donations.filter(user_id__in=user_ids)
+    return (
+        donations.order_by()
+        .values('user_id').annotate(count=Count('id')).filter(count__gte=rule['min_count'])
+        .values_list('user_id', flat=True)
+    )
+
+
+def _activity_candidates(rule, user_ids):
+    activities = UserActivity.objects.filter(activity_type__in=rule['activity_types'])
+    if user_ids is not None:
+        activities = activities.filter(user_id__in=user_ids)
+    return (
+        activities.order_by()
+        .values('user_id').annotate(count=Count('id')).filter(count__gte=rule['min_count'])
+        .values_list('user_id', flat=True)
+    )
+
+
+def _profile_candidates(rule, user_ids):
+    return UserProfile.objects.filter(rule['filter']).values_list('user_id', flat=True)
+
+
+CANDIDATES = {
+    'donation': _donation_candidates,
+    'activity': _activity_candidates,
+    'profile': _profile_candidates,
+}
+
+
+def evaluate_rules(full=False, batch_size=BADGE_CHECK_BATCH_SIZE):
+    """
+    Évaluer toutes les règles et attribuer les nouveaux badges (badge,
+    activité « Badge obtenu » et notification, insérés en lot).
+    Les règles de dons et d'activités ne portent que sur les utilisateurs
+    en file ; `full` réexamine tout l'historique. Les règles de profil sont
+    réévaluées à chaque passage. Retourne le nombre de badges attribués par badge.
+    """
+    awarded = {}
+    with transaction.atomic():
+        _apply_rules([rule for rule in BADGE_RULES if full or rule['source'] == 'profile'], None, awarded)
+
+    while True:
+        # Lot lu au début de la transaction et supprimé par id : une ligne
+        # écrite ou validée entre-temps reste en file
+        checks = list(BadgeCheck.objects.order_by('id').values_list('id', 'user_id')[:batch_size])
+        if not checks:
+            break
+        with transaction.atomic():
+            if not full:
+                rules = [rule for rule in BADGE_RULES if rule['source'] != 'profile']
+                _apply_rules(rules, {user_id for _, user_id in checks}, awarded)
+            BadgeCheck.objects.filter(id__in=[check_id for check_id, _ in checks]).delete()
+        if len(checks) < batch_size:
+            break
+    return awarded
+
+
+def _apply_rules(rules, user_ids, awarded):
+    for rule in rules:
+        candidates = CANDIDATES[rule['source']](rule, user_ids)
+        owners = UserBadge.objects.filter(badge=rule['badge']).values('user_id')
+        new_owners = list(candidates.exclude(user_id__in=owners))
+        if new_owners:
+            _award(rule['badge'], new_owners)
+            awarded[rule['badge']] = awarded.get(rule['badge'], 0) + len(new_owners)
+
+
+def _award(badge, user_ids):
+    info = BADGE_CATALOGUE.get(badge, {'name': badge})
+    UserBadge.objects.bulk_create([UserBadge(user_id=user_id, badge=badge) for user_id in user_ids], batch_size=1000, ignore_conflicts=True)
+    UserActivity.objects.bulk_create([
+        UserActivity(user_id=user_id, activity_type='badge_earned', description=f"Badge obtenu : {info['name']}")
+        for user_id in user_ids
+    ], batch_size=1000)
+    UserNotification.objects.bulk_create([
+        UserNotification(
+            user_id=user_id,
+            title='Nouveau badge !',
+            message=f"Félicitations, vous avez obtenu le badge « {info['name']} ».",
+            notification_type='badge',
+        )
+        for user_id in user_ids
+    ], batch_size=1000)
+    # Écritures en lot (sans signaux) : compteur de non lues et tableaux de bord
+    adjust_unread_count(user_ids, 1)
+    invalidate_dashboards(user_ids)
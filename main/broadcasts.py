@@ -0,0 +1,118 @@
+"""
+Envoi d'une notification à un segment de membres (rôle, langue, abonnés à
+la newsletter).
+
+`queue_broadcast` met l'envoi en file ; `send_broadcast` (commande
+`send_broadcasts`) crée les UserNotification par lots de destinataires
+parcourus par user_id. Chaque lot (notifications, compteurs de non lues et
+avancement) est écrit dans une transaction sous verrou de la diffusion :
+une interruption reprend après le dernier lot validé, sans doublon, même
+si deux commandes tournent en parallèle.
+"""
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import NotificationBroadcast, UserNotification, UserProfile
+from .notifications import adjust_unread_count
+
+logger = logging.getLogger(__name__)
+
+# Nombre de destinataires servis par transaction
+BROADCAST_CHUNK_SIZE = 1000
+
+
+def create_broadcast(title, message, *, notification_type='info', link_url=None,
+                     role='', language='', newsletter_only=False, created_by=None, queue=True):
+    """Créer une diffusion pour le segment donné et (par défaut) la mettre en file d'envoi"""
+    broadcast = NotificationBroadcast.objects.create(
+        title=title,
+        message=message,
+        notification_type=notification_type,
+        link_url=link_url,
+        role=role,
+        language=language,
+        newsletter_only=newsletter_only,
+        created_by=created_by,
+    )
+    if queue:
+        queue_broadcast(broadcast)
+    return broadcast
+
+
+def recipients(broadcast):
+    """Identifiants des utilisateurs du segment de `broadcast`, triés"""
+    profiles = UserProfile.objects.filter(user__is_active=True)
+    if broadcast.role:
+        profiles = profiles.filter(role=broadcast.role)
+    if broadcast.language:
+        profiles = profiles.filter(language_preference=broadcast.language)
+    if broadcast.newsletter_only:
+        profiles = profiles.filter(newsletter_subscription=True)
+    return profiles.order_by('user_id').values_list('user_id', flat=True)
+
+
+def queue_broadcast(broadcast):
+    """Mettre en file un brouillon ; retourne False si la diffusion est déjà en file ou envoyée"""
+    total = recipients(broadcast).count()
+    queued = NotificationBroadcast.objects.filter(pk=broadcast.pk, status='draft').update(
+        status='pending', total_recipients=total,
+    )
+    if queued:
+        broadcast.status, broadcast.total_recipients = 'pending', total
+    return bool(queued)
+
+
+def send_broadcast(broadcast, chunk_size=BROADCAST_CHUNK_SIZE, progress=None):
+    """
+    Envoyer (ou reprendre) une diffusion en file. `progress(broadcast)` est
+    appelé après chaque lot. Retourne le nombre de notifications créées.
+    """
+    created = 0
+    while True:
+        with transaction.atomic():
+            broadcast = NotificationBroadcast.objects.select_for_update().get(pk=broadcast.pk)
+            if broadcast.status not in ('pending', 'sending'):
+                return created
+            user_ids = list(recipients(broadcast).filter(user_id__gt=broadcast.last_user_id)[:chunk_size])
+            if user_ids:
+                UserNotification.objects.bulk_create([
+                    UserNotification(
+                        user_id=user_id,
+                        title=broadcast.title,
+                        message=broadcast.message,
+                        notification_type=broadcast.notification_type,
+                        link_url=broadcast.link_url,
+                    )
+                    for user_id in user_ids
+                ], batch_size=chunk_size)
+                # bulk_create n'émet pas post_save
+                adjust_unread_count(user_ids, 1)
+                broadcast.sent_count += len(user_ids)
+                broadcast.last_user_id = user_ids[-1]
+                broadcast.started_at = broadcast.started_at or timezone.now()
+            if len(user_ids) < chunk_size:
+                broadcast.status = 'sent'
+                broadcast.finished_at = timezone.now()
+            else:
+                broadcast.status = 'sending'
+            broadcast.save(update_fields=['sent_count', 'last_user_id', 'status', 'started_at', 'finished_at'])
+        created += len(user_ids)
+        if progress:
+            progress(broadcast)
+        if broadcast.status == 'sent':
+            return created
+
+
+def send_pending_broadcasts(chunk_size=BROADCAST_CHUNK_SIZE, progress=None):
+    """Envoyer toutes les diffusions en file, de la plus ancienne à la plus récente"""
+    sent = 0
+    pending = NotificationBroadcast.objects.filter(status__in=['pending', 'sending']).order_by('created_at', 'id')
+    for broadcast in pending:
+        try:
+            sent += send_broadcast(broadcast, chunk_size=chunk_size, progress=progress)
+        except Exception:
+            # Reprise au prochain passage, après le dernier lot validé
+            logger.exception("Échec de la diffusion %s", broadcast.pk)
+    return sent
@@ -0,0 +1,154 @@
+"""
+Cache « stale-while-revalidate » pour les valeurs coûteuses à calculer.
+
+Une valeur périmée est servie immédiatement pendant qu'un seul
+rafraîchissement (protégé par un verrou dans le cache) la recalcule
+en arrière-plan. Une valeur absente est calculée par un seul processus,
+les autres attendant brièvement son résultat. Des compteurs hit/miss/stale et la latence des
+rafraîchissements sont conservés dans le cache pour être exposés.
+"""
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+METRIC_NAMES = ('hits', 'misses', 'stale', 'waits', 'refreshes', 'refresh_errors', 'refresh_ms_total', 'refresh_ms_last')
+
+# Intervalle (secondes) entre deux lectures du cache en attendant le calcul
+# d'une valeur absente par un autre processus
+MISS_POLL_INTERVAL = 0.05
+
+def get_or_refresh(key, compute, ttl, stale_ttl=None):
+    """
+    Retourne la valeur en cache pour `key`, calculée par `compute()`.
+
+    - valeur fraîche (< ttl) : servie telle quelle ;
+    - valeur périmée (< ttl + stale_ttl) : servie, et un rafraîchissement
+      unique est lancé en arrière-plan ;
+    - absente : calculée de façon synchrone par le seul appel qui obtient le
+      verrou ; les autres attendent son résultat (au plus
+      SWR_CACHE_MISS_WAIT secondes) puis, à défaut, calculent eux-mêmes.
+    """
+    stale_ttl = ttl if stale_ttl is None else stale_ttl
+    entry = cache.get(_value_key(key))
+
+    if entry is not None:
+        value, fresh_until = entry
+        if time.time() < fresh_until:
+            _incr_metric(key, 'hits')
+            return value
+
+        _incr_metric(key, 'stale')
+        if cache.add(_lock_key(key), True, timeout=max(ttl, 30)):
+            if getattr(settings, 'SWR_CACHE_BACKGROUND_REFRESH', True):
+                threading.Thread(
+                    target=_threaded_refresh, args=(key, compute, ttl, stale_ttl), daemon=True
+                ).start()
+            else:
+                _background_refresh(key, compute, ttl, stale_ttl)
+        return value
+
+    _incr_metric(key, 'misses')
+    if cache.add(_lock_key(key), True, timeout=max(ttl, 30)):
+        try:
+            return refresh(key, compute, ttl, stale_ttl)
+        finally:
+            cache.delete(_lock_key(key))
+
+    # Un autre appel calcule déjà la valeur : attendre qu'il l'ait stockée
+    _incr_metric(key, 'waits')
+    deadline = time.monotonic() + getattr(settings, 'SWR_CACHE_MISS_WAIT', 5)
+    while time.monotonic() < deadline:
+        time.sleep(MISS_POLL_INTERVAL)
+        entry = cache.get(_value_key(key))
+        if entry is not None:
+            return entry[0]
+    return refresh(key, compute, ttl, stale_ttl)
+
+
+def refresh(key, compute, ttl, stale_ttl=None):
+    """Recalculer la valeur et la stocker dans le cache"""
+    stale_ttl = ttl if stale_ttl is None else stale_ttl
+    started = time.monotonic()
+    value = compute()
+    elapsed_ms = int((time.monotonic() - started) * 1000)
+
+    cache.set(_value_key(key), (value, time.time() + ttl), timeout=ttl + stale_ttl)
+    _incr_metric(key, 'refreshes')
+    _incr_metric(key, 'refresh_ms_total', elapsed_ms)
+    cache.set(_metric_key(key, 'refresh_ms_last'), elapsed_ms, timeout=None)
+    return value
+
+
+def invalidate(key):
+    """Supprimer la valeur en cache (le prochain appel la recalculera)"""
+    cache.delete(_value_key(key))
+
+
+def current_version(version_key):
+    """
+    Version stockée sous `version_key`, créée si absente. Une valeur mise en
+    cache avec sa version est périmée dès que la clé de version est supprimée.
+    """
+    version = uuid.uuid4().hex
+    if not cache.add(version_key, version, timeout=None):
+        version = cache.get(version_key, version)
+    return version
+
+
+def get_metrics(keys):
+    """
+    Compteurs des clés données. Les compteurs sont stockés dans le cache :
+    ils couvrent tous les processus, à condition de nommer les clés.
+    """
+    metrics = {}
+    for key in sorted(keys):
+        names = {_metric_key(key, name): name for name in METRIC_NAMES}
+        values = cache.get_many(list(names))
+        metrics[key] = {name: values.get(metric_key, 0) for metric_key, name in names.items()}
+    return metrics
+
+
+def _background_refresh(key, compute, ttl, stale_ttl):
+    try:
+        refresh(key, compute, ttl, stale_ttl)
+    except Exception:
+        _incr_metric(key, 'refresh_errors')
+        logger.exception("Échec du rafraîchissement du cache %s", key)
+    finally:
+        cache.delete(_lock_key(key))
+
+
+def _threaded_refresh(key, compute, ttl, stale_ttl):
+    try:
+        _background_refresh(key, compute, ttl, stale_ttl)
+    finally:
+        # Le thread possède ses propres connexions à la base
+        connections.close_all()
+
+
+def _incr_metric(key, name, amount=1):
+    metric_key = _metric_key(key, name)
+    if not cache.add(metric_key, amount, timeout=None):
+        try:
+            cache.incr(metric_key, amount)
+        except ValueError:
+            cache.set(metric_key, amount, timeout=None)
+
+
+def _value_key(key):
+    return f'swr:{key}:value'
+
+
+def _lock_key(key):
+    return f'swr:{key}:lock'
+
+
+def _metric_key(key, name):
+    return f'swr:{key}:metric:{name}'
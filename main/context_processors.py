@@ -0,0 +1,9 @@
+from .notifications import get_unread_count
+
+
+def unread_notifications(request):
+    """Nombre de notifications non lues pour le badge de la barre de navigation (servi par le cache)"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'unread_notifications_count': get_unread_count(user)}
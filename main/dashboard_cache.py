@@ -0,0 +1,90 @@
+"""
+Instantané du tableau de bord par utilisateur, conservé dans le cache.
+
+Chaque instantané est stocké avec la version de l'utilisateur pour laquelle
+il a été calculé ; la version et l'instantané sont lus ensemble (un seul
+aller-retour au cache, une requête avec DatabaseCache). Une écriture sur ses
+dons, participations, inscriptions MBC, activités ou badges supprime cette
+version (après commit) : le prochain affichage en crée une nouvelle et
+recalcule l'instantané, et un calcul concurrent commencé avant l'écriture
+stocke l'ancienne version, qui ne correspond plus.
+
+Les parties communes à tous (prochains événements, challenges actifs) sont
+servies par le cache stale-while-revalidate et invalidées à la modification
+d'un événement ou d'un challenge.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .caching import current_version, get_or_refresh, invalidate
+from .models import Donation, Event, EventParticipation, MBCParticipant, MutotoBikeChallenge, UserActivity
+
+UPCOMING_CACHE_KEY = 'dashboard:upcoming'
+
+
+def get_dashboard_snapshot(user, profile):
+    """Statistiques personnelles du tableau de bord de `user` (depuis le cache si possible)"""
+    version_key, snapshot_key = _version_key(user.pk), f'dashboard:{user.pk}:snapshot'
+    cached = cache.get_many([version_key, snapshot_key])
+    version, stored = cached.get(version_key), cached.get(snapshot_key)
+    if version is not None and stored is not None and stored[0] == version:
+        return stored[1]
+    if version is None:
+        version = current_version(version_key)
+    snapshot = _build_snapshot(user, profile)
+    cache.set(snapshot_key, (version, snapshot), timeout=getattr(settings, 'DASHBOARD_CACHE_TTL', 600))
+    return snapshot
+
+
+def get_upcoming():
+    """Prochains événements et challenges actifs, communs à tous les tableaux de bord"""
+    return get_or_refresh(
+        UPCOMING_CACHE_KEY,
+        _build_upcoming,
+        ttl=getattr(settings, 'DASHBOARD_UPCOMING_CACHE_TTL', 60),
+    )
+
+
+def invalidate_dashboards(user_ids):
+    """Invalider l'instantané des utilisateurs `user_ids` au commit de la transaction en cours"""
+    keys = [_version_key(user_id) for user_id in set(user_ids) if user_id]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_upcoming():
+    """Invalider les prochains événements et challenges (après commit)"""
+    transaction.on_commit(lambda: invalidate(UPCOMING_CACHE_KEY))
+
+
+def _build_snapshot(user, profile):
+    return {
+        'total_donations': Donation.objects.filter(user=user).aggregate(
+            total=Sum('amount'), count=Count('id')
+        ),
+        'events_participated': EventParticipation.objects.filter(
+            user=user, status__in=['confirmed', 'attended']
+        ).count(),
+        'challenges_completed': MBCParticipant.objects.filter(
+            user=user, status='confirmed'
+        ).count(),
+        'recent_activities': list(UserActivity.objects.filter(user=user)[:10]),
+        'badges_count': len(profile.get_badges_list()),
+    }
+
+
+def _build_upcoming():
+    now = timezone.now()
+    return {
+        'upcoming_events': list(Event.objects.filter(date__gte=now, is_active=True).order_by('date')[:5]),
+        'active_challenges': list(
+            MutotoBikeChallenge.objects.filter(is_active=True, date__gte=now).order_by('date')[:3]
+        ),
+    }
+
+
+def _version_key(user_id):
+    return f'dashboard:{user_id}:version'
@@ -4,20 +4,30 @@ from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib import messages
 from django.http import JsonResponse
+from django.db import transaction
 from django.db.models import Sum, Count, Q
 from django.utils import timezone
 from datetime import datetime, timedelta
-from django.core.paginator import Paginator
 from .models import (
     UserProfile, Donation, Event, EventParticipation, 
     MutotoBikeChallenge, MBCParticipant, UserNotification, 
     UserActivity, Project, ChatConversation, ChatMessage
 )
 from .forms import UserProfileForm
+from .leaderboard import get_period_leaderboard, get_rank
+from .pagination import InvalidCursor, KeysetPaginator
+from .badge_rules import BADGE_CATALOGUE
+from .dashboard_cache import get_dashboard_snapshot, get_upcoming
+from .notifications import get_unread_count, mark_all_read, mark_read
 import json
 
 from django.contrib.auth.decorators import user_passes_test
 
+# Taille des pages des historiques (pagination par clé)
+DONATIONS_PER_PAGE = 10
+NOTIFICATIONS_PER_PAGE = 15
+ACTIVITIES_PER_PAGE = 20
+
 # --- DASHBOARD CHAT VIEWS ---
 def is_staff_or_superuser(user):
     return user.is_superuser or user.is_staff or (hasattr(user, 'userprofile') and user.userprofile.role == 'staff')
@@ -49,53 +59,19 @@ def dashboard_home(request):
     user = request.user
     profile, created = UserProfile.objects.get_or_create(user=user)
     
-    # Statistiques utilisateur
-    total_donations = Donation.objects.filter(donor_email=user.email).aggregate(
-        total=Sum('amount'), count=Count('id')
-    )
-    
-    events_participated = EventParticipation.objects.filter(
-        user=user, status__in=['confirmed', 'attended']
-    ).count()
-    
-    challenges_completed = MBCParticipant.objects.filter(
-        participant_email=user.email, status='confirmed'
-    ).count()
-    
-    # Activités récentes
-    recent_activities = UserActivity.objects.filter(user=user)[:10]
-    
-    # Notifications non lues
-    unread_notifications = UserNotification.objects.filter(
-        user=user, is_read=False
-    ).count()
+    # Statistiques personnelles (instantané en cache, invalidé à chaque
+    # écriture de l'utilisateur) et prochains rendez-vous (communs à tous)
+    snapshot = get_dashboard_snapshot(user, profile)
+    upcoming = get_upcoming()
     
-    # Prochains événements
-    upcoming_events = Event.objects.filter(
-        date__gte=timezone.now(),
-        is_active=True
-    ).order_by('date')[:5]
-    
-    # Challenges actifs
-    active_challenges = MutotoBikeChallenge.objects.filter(
-        is_active=True,
-        date__gte=timezone.now()
-    ).order_by('date')[:3]
-    
-    # Classement utilisateur (basé sur les points)
-    user_ranking = UserProfile.objects.filter(
-        points__gt=profile.points
-    ).count() + 1
+    # Classement utilisateur (basé sur les points, table des rangs pré-calculée)
+    user_ranking = get_rank(profile, neighbours=0)['rank']
     
     context = {
         'profile': profile,
-        'total_donations': total_donations,
-        'events_participated': events_participated,
-        'challenges_completed': challenges_completed,
-        'recent_activities': recent_activities,
-        'unread_notifications': unread_notifications,
-        'upcoming_events': upcoming_events,
-        'active_challenges': active_challenges,
+        **snapshot,
+        **upcoming,
+        'unread_notifications': profile.unread_notifications,
         'user_ranking': user_ranking,
     }
     
@@ -131,21 +107,18 @@ def dashboard_profile(request):
 @login_required
 def dashboard_donations(request):
     """Historique des donations"""
-    donations = Donation.objects.filter(donor_email=request.user.email).order_by('-created_at')
+    donations = Donation.objects.filter(user=request.user).select_related('project')
     
-    # Pagination
-    paginator = Paginator(donations, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination par clé (created_at, id) : pas d'OFFSET ni de COUNT(*) par page
+    page_obj = KeysetPaginator(donations, DONATIONS_PER_PAGE).get_page(request.GET.get('cursor'))
     
-    # Statistiques
-    total_donated = donations.aggregate(total=Sum('amount'))['total'] or 0
-    donation_count = donations.count()
+    # Statistiques (une seule agrégation)
+    totals = donations.aggregate(total=Sum('amount'), count=Count('id'))
     
     context = {
         'page_obj': page_obj,
-        'total_donated': total_donated,
-        'donation_count': donation_count,
+        'total_donated': totals['total'] or 0,
+        'donation_count': totals['count'],
     }
     
     return render(request, 'main/dashboard/donations.html', context)
@@ -157,7 +130,7 @@ def dashboard_events(request):
     participations = EventParticipation.objects.filter(user=request.user).order_by('-registration_date')
     
     # Challenges MBC
-    mbc_participations = MBCParticipant.objects.filter(participant_email=request.user.email).order_by('-registered_at')
+    mbc_participations = MBCParticipant.objects.filter(user=request.user).order_by('-registered_at')
     
     # Événements disponibles
     available_events = Event.objects.filter(
@@ -182,17 +155,16 @@ def dashboard_notifications(request):
     
     # Marquer comme lues si demandé
     if request.GET.get('mark_read'):
-        notifications.filter(is_read=False).update(is_read=True)
+        mark_all_read(request.user)
         return redirect('main:dashboard_notifications')
     
-    # Pagination
-    paginator = Paginator(notifications, 15)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination par clé (created_at, id)
+    page_obj = KeysetPaginator(notifications, NOTIFICATIONS_PER_PAGE).get_page(request.GET.get('cursor'))
     
     context = {
         'page_obj': page_obj,
-        'unread_count': notifications.filter(is_read=False).count(),
+        'notifications': page_obj,
+        'unread_count': get_unread_count(request.user),
     }
     
     return render(request, 'main/dashboard/notifications.html', context)
@@ -203,63 +175,35 @@ def dashboard_badges(request):
     profile, created = UserProfile.objects.get_or_create(user=request.user)
     
     # Badges disponibles
-    available_badges = {
-        'first_donation': {
-            'name': 'Premier Don',
-            'description': 'Effectué votre premier don',
-            'icon': 'fas fa-heart',
-            'color': 'text-danger'
-        },
-        'generous_donor': {
-            'name': 'Donateur Généreux',
-            'description': 'Plus de 5 donations',
-            'icon': 'fas fa-hand-holding-heart',
-            'color': 'text-success'
-        },
-        'event_participant': {
-            'name': 'Participant Actif',
-            'description': 'Participé à un événement',
-            'icon': 'fas fa-calendar-check',
-            'color': 'text-primary'
-        },
-        'bike_challenger': {
-            'name': 'Cycliste AIME',
-            'description': 'Participé au Mutoto Bike Challenge',
-            'icon': 'fas fa-bicycle',
-            'color': 'text-warning'
-        },
-        'volunteer': {
-            'name': 'Bénévole',
-            'description': 'Inscrit comme bénévole',
-            'icon': 'fas fa-hands-helping',
-            'color': 'text-info'
-        },
-        'level_5': {
-            'name': 'Expert AIME',
-            'description': 'Atteint le niveau 5',
-            'icon': 'fas fa-star',
-            'color': 'text-warning'
-        }
-    }
+    available_badges = BADGE_CATALOGUE
     
     user_badges = profile.get_badges_list()
     
-    # Classement général
-    leaderboard = UserProfile.objects.filter(
-        points__gt=0
-    ).order_by('-points')[:10]
+    # Classement général ou de la semaine / du mois (totaux pré-agrégés
+    # par rollup_points)
+    leaderboard_period = request.GET.get('period', 'all')
+    if leaderboard_period in ('week', 'month'):
+        leaderboard = get_period_leaderboard(leaderboard_period)
+    else:
+        leaderboard_period = 'all'
+        leaderboard = UserProfile.objects.filter(
+            points__gt=0
+        ).select_related('user').order_by('-points')[:10]
     
-    # Position de l'utilisateur
-    user_position = UserProfile.objects.filter(
-        points__gt=profile.points
-    ).count() + 1
+    # Position de l'utilisateur et profils classés autour de lui
+    ranking = get_rank(profile)
     
     context = {
         'profile': profile,
         'available_badges': available_badges,
         'user_badges': user_badges,
+        'earned_badges': user_badges,
+        'badges_count': len(user_badges),
         'leaderboard': leaderboard,
-        'user_position': user_position,
+        'leaderboard_period': leaderboard_period,
+        'user_position': ranking['rank'],
+        'user_ranking': ranking['rank'],
+        'leaderboard_neighbours': ranking['neighbours'],
     }
     
     return render(request, 'main/dashboard/badges.html', context)
@@ -312,16 +256,15 @@ def dashboard_activities(request):
     if activity_type:
         activities = activities.filter(activity_type=activity_type)
     
-    # Pagination
-    paginator = Paginator(activities, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination par clé (timestamp, id)
+    page_obj = KeysetPaginator(activities, ACTIVITIES_PER_PAGE, field='timestamp').get_page(request.GET.get('cursor'))
     
     # Types d'activités pour le filtre
     activity_types = UserActivity.ACTIVITY_TYPES
     
     context = {
         'page_obj': page_obj,
+        'activities': page_obj,
         'activity_types': activity_types,
         'current_filter': activity_type,
     }
@@ -334,32 +277,36 @@ def join_event(request, event_id):
     if request.method == 'POST':
         event = get_object_or_404(Event, id=event_id, is_active=True)
         
-        participation, created = EventParticipation.objects.get_or_create(
-            user=request.user,
-            event=event,
-            defaults={'status': 'registered'}
-        )
-        
-        if created:
-            # Ajouter des points
-            profile = request.user.userprofile
-            profile.add_points(50)
-            
-            # Enregistrer l'activité
-            UserActivity.objects.create(
-                user=request.user,
-                activity_type='registration',
-                description=f'Inscription à l\'événement: {event.name}'
-            )
-            
-            # Notification
-            UserNotification.objects.create(
+        # Participation, points, activité et notification (et les lignes
+        # d'outbox et de badges écrites par post_save) validés ensemble
+        with transaction.atomic():
+            participation, created = EventParticipation.objects.get_or_create(
                 user=request.user,
-                title='Inscription confirmée',
-                message=f'Vous êtes inscrit à l\'événement "{event.name}"',
-                notification_type='success'
+                event=event,
+                defaults={'status': 'registered'}
             )
             
+            if created:
+                # Ajouter des points
+                profile = request.user.userprofile
+                profile.add_points(50, reason='event_registration')
+                
+                # Enregistrer l'activité
+                UserActivity.objects.create(
+                    user=request.user,
+                    activity_type='event_participation',
+                    description=f'Inscription à l\'événement: {event.name}'
+                )
+                
+                # Notification
+                UserNotification.objects.create(
+                    user=request.user,
+                    title='Inscription confirmée',
+                    message=f'Vous êtes inscrit à l\'événement "{event.name}"',
+                    notification_type='success'
+                )
+        
+        if created:
             messages.success(request, f'Inscription à "{event.name}" confirmée!')
         else:
             messages.info(request, 'Vous êtes déjà inscrit à cet événement.')
@@ -375,7 +322,7 @@ def join_challenge(request, challenge_id):
         # Vérifier si déjà inscrit
         existing = MBCParticipant.objects.filter(
             event=challenge,
-            participant_email=request.user.email
+            user=request.user
         ).first()
         
         if not existing:
@@ -384,6 +331,7 @@ def join_challenge(request, challenge_id):
                 event=challenge,
                 participant_name=request.user.get_full_name() or request.user.username,
                 participant_email=request.user.email,
+                user=request.user,
                 participant_phone=getattr(request.user.userprofile, 'phone', ''),
                 age=25,  # Valeur par défaut
                 emergency_contact='Contact d\'urgence',
@@ -393,7 +341,7 @@ def join_challenge(request, challenge_id):
             
             # Ajouter des points et badge
             profile = request.user.userprofile
-            profile.add_points(100)
+            profile.add_points(100, reason='challenge_registration')
             profile.add_badge('bike_challenger')
             
             # Enregistrer l'activité
@@ -421,13 +369,73 @@ def join_challenge(request, challenge_id):
 def mark_notification_read(request, notification_id):
     """Marquer une notification comme lue"""
     if request.method == 'POST':
-        notification = get_object_or_404(
-            UserNotification, 
-            id=notification_id, 
-            user=request.user
-        )
-        notification.is_read = True
-        notification.save()
+        # Compteur de non lues décrémenté atomiquement (si elle ne l'était pas déjà)
+        if not mark_read(request.user, notification_id):
+            get_object_or_404(UserNotification, id=notification_id, user=request.user)
         return JsonResponse({'status': 'success'})
     
     return JsonResponse({'status': 'error'})
+
+# --- « Charger plus » : pages suivantes des historiques en JSON ---
+def _load_more(request, paginator, serialize):
+    """
+    Page suivant `?cursor=` sous forme JSON ; avec `?total=1`, ajoute le
+    total compté jusqu'à APPROXIMATE_COUNT_LIMIT (`total_exact` faux au-delà).
+    """
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return JsonResponse({'status': 'error', 'message': 'Curseur invalide'}, status=400)
+    data = {
+        'status': 'success',
+        'items': [serialize(item) for item in page],
+        'next_cursor': page.next_cursor,
+        'has_next': page.has_next,
+    }
+    if request.GET.get('total'):
+        data['total'], data['total_exact'] = paginator.approximate_count()
+    return JsonResponse(data)
+
+@login_required
+def load_more_notifications(request):
+    """Notifications suivantes (JSON)"""
+    paginator = KeysetPaginator(UserNotification.objects.filter(user=request.user), NOTIFICATIONS_PER_PAGE)
+    return _load_more(request, paginator, lambda notification: {
+        'id': notification.id,
+        'title': notification.title,
+        'message': notification.message,
+        'notification_type': notification.notification_type,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at.isoformat(),
+        'link_url': notification.link_url,
+    })
+
+@login_required
+def load_more_activities(request):
+    """Activités suivantes (JSON), avec le même filtre `?type=` que la page"""
+    activities = UserActivity.objects.filter(user=request.user)
+    if request.GET.get('type'):
+        activities = activities.filter(activity_type=request.GET['type'])
+    paginator = KeysetPaginator(activities, ACTIVITIES_PER_PAGE, field='timestamp')
+    return _load_more(request, paginator, lambda activity: {
+        'id': activity.id,
+        'activity_type': activity.activity_type,
+        'activity_type_display': activity.get_activity_type_display(),
+        'description': activity.description,
+        'timestamp': activity.timestamp.isoformat(),
+    })
+
+@login_required
+def load_more_donations(request):
+    """Dons suivants (JSON)"""
+    donations = Donation.objects.filter(user=request.user).select_related('project')
+    paginator = KeysetPaginator(donations, DONATIONS_PER_PAGE)
+    return _load_more(request, paginator, lambda donation: {
+        'id': donation.id,
+        'amount': str(donation.amount),
+        'currency': donation.currency,
+        'project': donation.project.name if donation.project else None,
+        'status': donation.status,
+        'status_display': donation.get_status_display(),
+        'created_at': donation.created_at.isoformat(),
+    })
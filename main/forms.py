@@ -3,7 +3,7 @@ from django.core.validators import RegexValidator
 from django.contrib.auth.models import User
 from .models import (
     ContactMessage, NewsletterSubscription, MBCParticipant, 
-    Donation, MutotoBikeChallenge, UserProfile
+    Donation, MutotoBikeChallenge, UserProfile, ImpactPoint
 )
 
 class UserProfileForm(forms.ModelForm):
@@ -281,3 +281,15 @@ class EventRegistrationForm(forms.Form):
             'placeholder': 'Régimes alimentaires spéciaux ou allergies'
         })
     )
+
+class ImpactPointForm(forms.ModelForm):
+    """Validation d'un point d'impact reçu par l'API d'import en lot"""
+    latitude = forms.DecimalField(max_digits=9, decimal_places=6, min_value=-90, max_value=90)
+    longitude = forms.DecimalField(max_digits=9, decimal_places=6, min_value=-180, max_value=180)
+    
+    class Meta:
+        model = ImpactPoint
+        fields = [
+            'type', 'related_id', 'related_model', 'latitude', 'longitude',
+            'description', 'value', 'status'
+        ]
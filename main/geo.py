@@ -0,0 +1,86 @@
+"""
+Outils géographiques pour la carte interactive (projection Web Mercator,
+identiques au découpage en tuiles z/x/y utilisé par Leaflet)
+"""
+import math
+
+MAX_LATITUDE = 85.05112878
+
+
+def lat_lng_to_tile(lat, lng, zoom):
+    """Coordonnées (x, y) de la tuile contenant le point au niveau de zoom donné"""
+    lat = max(min(float(lat), MAX_LATITUDE), -MAX_LATITUDE)
+    n = 1 << zoom
+    x = int((float(lng) + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(zoom, x, y):
+    """Emprise (ouest, sud, est, nord) d'une tuile"""
+    n = 1 << zoom
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return west, south, east, north
+
+
+def parse_bbox(value):
+    """Lire une emprise 'ouest,sud,est,nord' (lève ValueError si invalide)"""
+    west, south, east, north = (float(part) for part in value.split(','))
+    if not (-180 <= west <= east <= 180 and -90 <= south <= north <= 90):
+        raise ValueError("Emprise invalide")
+    return west, south, east, north
+
+
+# --- Geohash ---
+GEOHASH_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Précision stockée en base (cellules d'environ 5 m x 5 m)
+GEOHASH_PRECISION = 9
+
+
+def encode_geohash(lat, lng, precision=GEOHASH_PRECISION):
+    """Geohash d'un point (chaîne base32 de `precision` caractères)"""
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    lat, lng = float(lat), float(lng)
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        current, coordinate = (lng_range, lng) if even else (lat_range, lat)
+        middle = (current[0] + current[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            current[0] = middle
+        else:
+            current[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def geohash_prefix_for_bbox(bbox):
+    """Plus long préfixe geohash commun aux quatre coins d'une emprise"""
+    west, south, east, north = bbox
+    corners = [
+        encode_geohash(lat, lng) for lat, lng in
+        ((south, west), (south, min(east, 179.999999)), (min(north, 89.999999), west), (min(north, 89.999999), min(east, 179.999999)))
+    ]
+    prefix = corners[0]
+    for corner in corners[1:]:
+        while not corner.startswith(prefix):
+            prefix = prefix[:-1]
+    return prefix
+
+
+def geohash_prefix_filter(prefix, field='geohash'):
+    """
+    Filtre « commence par `prefix` » exprimé en intervalle, afin que l'index
+    de la colonne soit utilisé quel que soit le moteur de base de données
+    """
+    if not prefix:
+        return {}
+    return {f'{field}__gte': prefix, f'{field}__lt': prefix + '~'}
@@ -0,0 +1,406 @@
+"""
+Index de la carte d'impact : agrégats pré-calculés des ImpactPoint par
+cellule de grille (ImpactCluster), mis à jour par deltas à chaque
+modification de point et reconstruits par `rebuild_impact_clusters`.
+"""
+import base64
+import json
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .geo import geohash_prefix_filter, geohash_prefix_for_bbox, lat_lng_to_tile, tile_bounds
+from .models import ImpactCluster, ImpactPoint, SiteStatistics
+
+logger = logging.getLogger(__name__)
+
+# Au-delà de ce zoom, la carte affiche les points individuels
+MAX_CLUSTER_ZOOM = 14
+# Une cellule de regroupement = 1/4 de tuile (64 px de côté)
+CLUSTER_CELL_ZOOM_OFFSET = 2
+# Nombre maximum de points individuels renvoyés pour une emprise
+MAX_POINTS_PER_REQUEST = 2000
+# Zooms servis par l'API de tuiles (en dessous, la carte utilise les regroupements)
+MIN_TILE_ZOOM = MAX_CLUSTER_ZOOM + 1
+MAX_TILE_ZOOM = 18
+# Durée de conservation d'une tuile dans le cache serveur (invalidée à chaque modification)
+TILE_CACHE_TIMEOUT = 24 * 3600
+# Nombre de points lus (et écrits) par lot lors de l'export GeoJSON complet
+EXPORT_CHUNK_SIZE = 500
+# Date de la dernière suppression d'un point (Last-Modified de l'export)
+LAST_DELETION_KEY = 'impact_points:last_deletion'
+# Nombre maximum de points renvoyés par appel du flux incrémental
+CHANGES_PAGE_SIZE = 200
+# updated_at est daté avant le commit : un point peut apparaître en base avec
+# une date antérieure à des points déjà lus. Le curseur du flux ne dépasse
+# jamais `maintenant - fenêtre` (durée maximale d'une transaction d'écriture) ;
+# les points plus récents sont renvoyés à chaque appel jusqu'à sortir de la
+# fenêtre, le client les dédoublonne par (id, updated_at).
+CHANGES_SAFETY_WINDOW = timedelta(seconds=30)
+# Nombre de lignes validées puis insérées par transaction lors d'un import en lot
+INGEST_CHUNK_SIZE = 500
+
+
+def record_point_changes(changes):
+    """
+    Répercuter des modifications de points sur l'index de la carte :
+    agrégats ImpactCluster et cache des tuiles.
+    """
+    changes = list(changes)
+    apply_point_changes(changes)
+    invalidate_tiles(changes)
+
+
+def cluster_cells(lat, lng):
+    """Cellules (zoom, x, y) contenant le point, pour chaque niveau de zoom"""
+    return [
+        (zoom,) + lat_lng_to_tile(lat, lng, zoom + CLUSTER_CELL_ZOOM_OFFSET)
+        for zoom in range(MAX_CLUSTER_ZOOM + 1)
+    ]
+
+
+def _accumulate(totals, state, sign):
+    if state is None or state['latitude'] is None or state['longitude'] is None:
+        return
+    lat, lng = float(state['latitude']), float(state['longitude'])
+    value = Decimal(state['value'] or 0)
+    for cell in cluster_cells(lat, lng):
+        total = totals[cell]
+        total[0] += sign
+        total[1] += sign * value
+        total[2] += sign * lat
+        total[3] += sign * lng
+
+
+def apply_point_changes(changes):
+    """
+    Mettre à jour les agrégats pour une série de modifications de points.
+    `changes` contient des couples (avant, après) de dictionnaires
+    {latitude, longitude, value}, None pour une création ou une suppression.
+    """
+    totals = defaultdict(lambda: [0, Decimal(0), 0.0, 0.0])
+    for before, after in changes:
+        _accumulate(totals, before, -1)
+        _accumulate(totals, after, 1)
+
+    emptied = Q()
+    for (zoom, x, y), (count, value, lat_sum, lng_sum) in totals.items():
+        if not (count or value or lat_sum or lng_sum):
+            continue
+        cell = ImpactCluster.objects.filter(zoom=zoom, cell_x=x, cell_y=y)
+        increments = {
+            'point_count': F('point_count') + count,
+            'value_sum': F('value_sum') + value,
+            'latitude_sum': F('latitude_sum') + lat_sum,
+            'longitude_sum': F('longitude_sum') + lng_sum,
+        }
+        if not cell.update(**increments):
+            try:
+                with transaction.atomic():
+                    ImpactCluster.objects.create(
+                        zoom=zoom, cell_x=x, cell_y=y, point_count=count,
+                        value_sum=value, latitude_sum=lat_sum, longitude_sum=lng_sum,
+                    )
+            except IntegrityError:
+                # Cellule créée entre-temps par une autre requête
+                cell.update(**increments)
+        if count < 0:
+            emptied |= Q(zoom=zoom, cell_x=x, cell_y=y)
+
+    if emptied:
+        ImpactCluster.objects.filter(emptied, point_count__lte=0).delete()
+
+
+def rebuild_clusters():
+    """Recalculer tous les agrégats depuis la table ImpactPoint"""
+    totals = defaultdict(lambda: [0, Decimal(0), 0.0, 0.0])
+    points = ImpactPoint.objects.filter(
+        latitude__isnull=False, longitude__isnull=False
+    ).values('latitude', 'longitude', 'value')
+    for state in points.iterator(chunk_size=2000):
+        _accumulate(totals, state, 1)
+
+    with transaction.atomic():
+        ImpactCluster.objects.all().delete()
+        ImpactCluster.objects.bulk_create(
+            [
+                ImpactCluster(
+                    zoom=zoom, cell_x=x, cell_y=y, point_count=count,
+                    value_sum=value, latitude_sum=lat_sum, longitude_sum=lng_sum,
+                )
+                for (zoom, x, y), (count, value, lat_sum, lng_sum) in totals.items()
+            ],
+            batch_size=1000,
+        )
+    return len(totals)
+
+
+def get_clusters(zoom, bbox):
+    """Agrégats visibles dans l'emprise (ouest, sud, est, nord) au zoom donné"""
+    west, south, east, north = bbox
+    grid_zoom = zoom + CLUSTER_CELL_ZOOM_OFFSET
+    min_x, min_y = lat_lng_to_tile(north, west, grid_zoom)
+    max_x, max_y = lat_lng_to_tile(south, east, grid_zoom)
+    clusters = ImpactCluster.objects.filter(
+        zoom=zoom,
+        cell_x__range=(min_x, max_x),
+        cell_y__range=(min_y, max_y),
+        point_count__gt=0,
+    )
+    return [
+        {
+            'lat': cluster.latitude_sum / cluster.point_count,
+            'lng': cluster.longitude_sum / cluster.point_count,
+            'count': cluster.point_count,
+            'value': float(cluster.value_sum),
+        }
+        for cluster in clusters
+    ]
+
+
+def get_points(bbox, point_type=None, status=None):
+    """Points individuels dans l'emprise (zooms élevés), filtrés par type et statut"""
+    west, south, east, north = bbox
+    points = ImpactPoint.objects.filter(
+        **geohash_prefix_filter(geohash_prefix_for_bbox(bbox)),
+        latitude__range=(south, north),
+        longitude__range=(west, east),
+    )
+    if point_type:
+        points = points.filter(type=point_type)
+    if status:
+        points = points.filter(status=status)
+    return [point_to_dict(point) for point in points.order_by('-created_at')[:MAX_POINTS_PER_REQUEST]]
+
+
+def point_to_dict(point):
+    """Représentation JSON d'un point d'impact pour la carte"""
+    return {
+        'id': point.id,
+        'title': point.description or point.type,
+        'description': point.description,
+        'type': point.type,
+        'lat': float(point.latitude) if point.latitude is not None else None,
+        'lng': float(point.longitude) if point.longitude is not None else None,
+        'impact_value': float(point.value) if point.value else None,
+        'date': point.created_at.strftime('%Y-%m-%d'),
+        'status': point.status,
+        'updated_at': point.updated_at.isoformat(),
+    }
+
+
+def _tile_version_key(zoom, x, y):
+    return f'impact_tile_version:{zoom}:{x}:{y}'
+
+
+def tile_version(zoom, x, y):
+    """Version courante d'une tuile (change à chaque modification d'un de ses points)"""
+    return cache.get_or_set(_tile_version_key(zoom, x, y), time.time_ns(), timeout=None)
+
+
+def invalidate_tiles(changes):
+    """
+    Changer la version des tuiles contenant les positions avant/après de
+    chaque point, au commit : une tuile relue avant le commit serait sinon
+    mise en cache sous la nouvelle version avec l'ancien contenu.
+    """
+    keys = set()
+    for states in changes:
+        for state in states:
+            if state is None or state['latitude'] is None or state['longitude'] is None:
+                continue
+            for zoom in range(MIN_TILE_ZOOM, MAX_TILE_ZOOM + 1):
+                keys.add(_tile_version_key(zoom, *lat_lng_to_tile(state['latitude'], state['longitude'], zoom)))
+    if keys:
+        transaction.on_commit(lambda: cache.set_many({key: time.time_ns() for key in keys}, timeout=None))
+
+
+def record_point_deletion():
+    """
+    Dater (au commit) la dernière suppression de point : une suppression ne
+    change pas Max(updated_at), le validateur de l'export en tient compte.
+    """
+    transaction.on_commit(lambda: cache.set(LAST_DELETION_KEY, timezone.now(), timeout=None))
+
+
+def last_point_deletion():
+    """Date de la dernière suppression ; inconnue (cache vidé) : maintenant"""
+    return cache.get_or_set(LAST_DELETION_KEY, timezone.now, timeout=None)
+
+
+def get_tile(zoom, x, y, point_type=None, status=None):
+    """
+    GeoJSON (FeatureCollection) des points d'une tuile z/x/y, filtrés par
+    type et statut. Le résultat est mis en cache sous la version de la tuile.
+    """
+    cache_key = f'impact_tile:{zoom}:{x}:{y}:{tile_version(zoom, x, y)}:{point_type or ""}:{status or ""}'
+    tile = cache.get(cache_key)
+    if tile is not None:
+        return tile
+
+    west, south, east, north = tile_bounds(zoom, x, y)
+    # Bornes sud/est exclues pour qu'un point n'appartienne qu'à une tuile
+    points = ImpactPoint.objects.filter(
+        **geohash_prefix_filter(geohash_prefix_for_bbox((west, south, east, north))),
+        latitude__gt=south, latitude__lte=north,
+        longitude__gte=west, longitude__lt=east,
+    )
+    if point_type:
+        points = points.filter(type=point_type)
+    if status:
+        points = points.filter(status=status)
+
+    tile = {
+        'type': 'FeatureCollection',
+        'features': [point_to_feature(point) for point in points.order_by('id')],
+    }
+    cache.set(cache_key, tile, timeout=TILE_CACHE_TIMEOUT)
+    return tile
+
+
+def point_to_feature(point):
+    """Représentation GeoJSON d'un point d'impact"""
+    properties = point_to_dict(point)
+    lat, lng = properties.pop('lat'), properties.pop('lng')
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [lng, lat]},
+        'properties': properties,
+    }
+
+
+def stream_geojson(points, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Générateur produisant une FeatureCollection GeoJSON morceau par morceau,
+    sans jamais charger toute la table en mémoire.
+
+    Les lots sont lus par clé (id > dernier id) plutôt qu'avec
+    `.iterator()` : le pilote MySQL met en mémoire tout le résultat
+    d'une requête, même parcourue avec un itérateur.
+    """
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = ''
+    last_id = 0
+    while True:
+        batch = list(points.filter(id__gt=last_id).order_by('id')[:chunk_size])
+        if not batch:
+            break
+        yield separator + ','.join(json.dumps(point_to_feature(point)) for point in batch)
+        separator = ','
+        last_id = batch[-1].id
+    yield ']}'
+
+
+def encode_cursor(updated_at, point_id):
+    """Curseur opaque du flux incrémental (position updated_at, id)"""
+    raw = f'{updated_at.isoformat()}|{point_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Lire un curseur (lève ValueError s'il est invalide)"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        updated_at, point_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(updated_at), int(point_id)
+    except (TypeError, UnicodeDecodeError, base64.binascii.Error) as error:
+        raise ValueError("Curseur invalide") from error
+
+
+def _settled_position():
+    """Position (updated_at, id) avant laquelle plus aucun point ne peut être validé"""
+    return timezone.now() - CHANGES_SAFETY_WINDOW, 0
+
+
+def current_cursor():
+    """Curseur positionné après le dernier point créé ou modifié (hors fenêtre de sécurité)"""
+    last = ImpactPoint.objects.order_by('-updated_at', '-id').only('id', 'updated_at').first()
+    if last is None:
+        return encode_cursor(datetime.fromtimestamp(0).astimezone(), 0)
+    return encode_cursor(*min((last.updated_at, last.id), _settled_position()))
+
+
+def get_changes_since(cursor, limit=CHANGES_PAGE_SIZE):
+    """
+    Points créés ou modifiés après le curseur, dans l'ordre (updated_at, id).
+    Retourne (points, curseur suivant, reste-t-il des points). Les points de
+    la fenêtre de sécurité sont renvoyés mais le curseur ne les dépasse pas.
+    """
+    updated_at, point_id = decode_cursor(cursor)
+    points = list(
+        ImpactPoint.objects.filter(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=point_id)
+        ).order_by('updated_at', 'id')[:limit + 1]
+    )
+    has_more = len(points) > limit
+    points = points[:limit]
+    if points:
+        last, settled = (points[-1].updated_at, points[-1].id), _settled_position()
+        if last > settled:
+            # La suite sera lue une fois la fenêtre écoulée : la page suivante
+            # repartirait du même curseur
+            last, has_more = settled, False
+        cursor = encode_cursor(*last)
+    return points, cursor, has_more
+
+
+def ingest_points(rows, chunk_size=INGEST_CHUNK_SIZE):
+    """
+    Importer des points d'impact en lot. `rows` produit des couples
+    (numéro de ligne, données) ; les données invalides sont ignorées et
+    signalées sans interrompre l'import. Chaque lot est validé puis inséré
+    avec `bulk_create` dans sa propre transaction.
+    Retourne (nombre de points créés, liste des erreurs par ligne).
+    """
+    from .forms import ImpactPointForm
+    from .utils import count_statistic
+
+    created, errors = 0, []
+    chunk = []
+
+    def flush():
+        nonlocal created
+        rows, points = [], []
+        for row, data in chunk:
+            if not isinstance(data, dict):
+                errors.append({'row': row, 'errors': {'__all__': ['Objet JSON attendu']}})
+                continue
+            form = ImpactPointForm(data)
+            if not form.is_valid():
+                errors.append({'row': row, 'errors': {
+                    field: list(messages) for field, messages in form.errors.items()
+                }})
+                continue
+            point = form.save(commit=False)
+            point.update_geohash()
+            rows.append(row)
+            points.append(point)
+        chunk.clear()
+        if not points:
+            return
+        try:
+            with transaction.atomic():
+                # bulk_create n'émet pas post_save : l'index de la carte et
+                # les statistiques sont mis à jour ici, dans la même transaction
+                ImpactPoint.objects.bulk_create(points)
+                record_point_changes([(None, point.tracked_values()) for point in points])
+                SiteStatistics.set_counters({'impact_locations': count_statistic('impact_locations')})
+        except DatabaseError as error:
+            logger.exception("Échec de l'import d'un lot de points d'impact")
+            errors.extend({'row': row, 'errors': {'__all__': [str(error)]}} for row in rows)
+            return
+        created += len(points)
+
+    for row, data in rows:
+        chunk.append((row, data))
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+    return created, errors
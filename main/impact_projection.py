@@ -0,0 +1,279 @@
+"""
+Projection des dons, participations et contributions staff sur ImpactPoint.
+
+Les signaux n'écrivent qu'une ligne ImpactOutbox ; `drain_outbox` (commande
+`drain_impact_outbox`) applique ensuite les projections par lots : une
+lecture des sources, une lecture des points existants, puis `bulk_create` /
+`bulk_update`.
+
+post_save est émis après l'écriture de la source, hors de la transaction
+implicite de save() : la ligne d'outbox n'est validée avec la source que si
+l'appelant enregistre celle-ci dans `transaction.atomic()` (vue de don,
+inscription à un événement ; l'admin le fait déjà). En autocommit, une
+panne entre les deux écritures perdrait la projection jusqu'au prochain
+`project_impact_points`.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import connections, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .impact_map import invalidate_tiles, record_point_changes, record_point_deletion
+from .models import Donation, EventParticipation, ImpactOutbox, ImpactPoint, SiteStatistics, StaffContribution
+from .utils import count_statistic
+
+logger = logging.getLogger(__name__)
+
+# Nombre de lignes d'outbox traitées par transaction
+OUTBOX_BATCH_SIZE = 500
+# Au-delà, la ligne est conservée pour analyse mais n'est plus retentée
+OUTBOX_MAX_ATTEMPTS = 5
+# Délai avant nouvelle tentative : OUTBOX_RETRY_DELAY * 2 ** (tentatives - 1)
+OUTBOX_RETRY_DELAY = timedelta(seconds=30)
+
+PROJECTED_FIELDS = ['type', 'latitude', 'longitude', 'description', 'value', 'status']
+# Nombre de sources recalculées par transaction par project_queryset
+PROJECTION_BATCH_SIZE = 1000
+
+# Règles de projection par modèle source : le point n'existe que si `eligible`
+# (évalué sur les champs suivis) est vrai, avec les valeurs renvoyées par
+# `fields` ; `tracked` liste les champs dont la modification change le point.
+PROJECTIONS = {
+    Donation: {
+        'select_related': (),
+        'tracked': ('status', 'amount', 'donor_name', 'message'),
+        'eligible': lambda state: state['status'] == 'completed',
+        'fields': lambda donation: {
+            'type': 'donation',
+            'latitude': None,
+            'longitude': None,
+            'description': donation.message or f"Don de {donation.donor_name}",
+            'value': donation.amount,
+            'status': donation.status,
+        },
+    },
+    EventParticipation: {
+        'select_related': ('event',),
+        'tracked': ('status', 'event_id'),
+        'eligible': lambda state: state['status'] in ['confirmed', 'attended'],
+        'fields': lambda participation: {
+            'type': 'participation',
+            'latitude': None,
+            'longitude': None,
+            'description': f"Participation à {participation.event.title}",
+            'value': None,
+            'status': participation.status,
+        },
+    },
+    StaffContribution: {
+        'select_related': (),
+        'tracked': ('amount', 'is_recorded', 'validated_at', 'object', 'month'),
+        'eligible': lambda state: bool(state['is_recorded'] and state['validated_at']),
+        'fields': lambda contribution: {
+            'type': 'contribution',
+            'latitude': None,
+            'longitude': None,
+            'description': contribution.object or f"Contribution staff {contribution.month}",
+            'value': contribution.amount,
+            'status': 'completed',
+        },
+    },
+}
+
+PROJECTED_MODELS = {model.__name__: model for model in PROJECTIONS}
+
+
+def enqueue(instance):
+    """
+    Inscrire une source modifiée dans l'outbox, dans la transaction en cours
+    (celle de la sauvegarde si l'appelant l'a ouverte avec `atomic()`)
+    """
+    ImpactOutbox.objects.create(source_model=type(instance).__name__, source_id=instance.pk)
+
+
+def enqueue_if_changed(instance):
+    """
+    Inscrire la source dans l'outbox seulement si son point d'impact change :
+    source (ou ancienne version) éligible et champ projeté modifié.
+    """
+    rules = PROJECTIONS[type(instance)]
+    previous = instance.tracked_previous()
+    if not rules['eligible'](instance.tracked_values()) and not (previous and rules['eligible'](previous)):
+        return
+    if instance.tracked_changed(*rules['tracked']):
+        enqueue(instance)
+
+
+def project(model, ids, update_clusters=True):
+    """
+    Recalculer les ImpactPoint des sources `ids` du modèle `model` : création
+    ou mise à jour pour les sources éligibles, suppression pour les sources
+    supprimées ou devenues inéligibles. Retourne le nombre de points modifiés.
+    `update_clusters=False` laisse les regroupements de la carte à
+    l'appelant (`rebuild_clusters` une fois pour toute une opération en masse).
+    """
+    rules = PROJECTIONS[model]
+    ids = set(ids)
+    sources = model.objects.filter(pk__in=ids).select_related(*rules['select_related'])
+    existing = {}
+    for point in ImpactPoint.objects.filter(related_model=model.__name__, related_id__in=ids).order_by('id'):
+        existing.setdefault(point.related_id, point)
+
+    now = timezone.now()
+    to_create, to_update, changes = [], [], []
+    for source in sources:
+        if not rules['eligible'](source.tracked_values()):
+            continue
+        fields = rules['fields'](source)
+        point = existing.pop(source.pk, None)
+        if point is None:
+            point = ImpactPoint(related_id=source.pk, related_model=model.__name__, **fields)
+            point.update_geohash()
+            to_create.append(point)
+            changes.append((None, point.tracked_values()))
+        elif any(getattr(point, name) != value for name, value in fields.items()):
+            previous = point.tracked_previous()
+            for name, value in fields.items():
+                setattr(point, name, value)
+            point.update_geohash()
+            # bulk_update ne renseigne pas auto_now : le flux incrémental en dépend
+            point.updated_at = now
+            to_update.append(point)
+            changes.append((previous, point.tracked_values()))
+
+    if to_create:
+        ImpactPoint.objects.bulk_create(to_create)
+    if to_update:
+        ImpactPoint.objects.bulk_update(to_update, PROJECTED_FIELDS + ['geohash', 'updated_at'])
+    if changes:
+        # bulk_create / bulk_update n'émettent pas post_save
+        if update_clusters:
+            record_point_changes(changes)
+        else:
+            invalidate_tiles(changes)
+        if any(state['geohash'] for change in changes for state in change if state):
+            SiteStatistics.set_counters({'impact_locations': count_statistic('impact_locations')})
+    # Points restants : source supprimée ou devenue inéligible
+    # (l'index de la carte est mis à jour par post_delete)
+    deleted = 0
+    if existing:
+        deleted, _ = ImpactPoint.objects.filter(
+            related_model=model.__name__, related_id__in=list(existing)
+        ).delete()
+        record_point_deletion()
+    return len(changes) + deleted
+
+
+def project_queryset(queryset, batch_size=PROJECTION_BATCH_SIZE, update_clusters=True):
+    """
+    Recalculer les ImpactPoint d'un ensemble de sources (par exemple après un
+    `update()` ou un `bulk_create()`, qui n'émettent pas post_save). Les
+    sources sont parcourues par lots de clés, une transaction par lot.
+    Retourne le nombre de points créés, modifiés ou supprimés.
+    """
+    model = queryset.model
+    ids = queryset.order_by('pk').values_list('pk', flat=True)
+    projected, last_id = 0, None
+    while True:
+        batch = list((ids.filter(pk__gt=last_id) if last_id is not None else ids)[:batch_size])
+        if not batch:
+            return projected
+        with transaction.atomic():
+            projected += project(model, batch, update_clusters=update_clusters)
+        if len(batch) < batch_size:
+            return projected
+        last_id = batch[-1]
+
+
+def project_range(model, first_id, last_id=None, batch_size=PROJECTION_BATCH_SIZE, update_clusters=True):
+    """
+    Recalculer les ImpactPoint des sources dont l'id est compris entre
+    `first_id` et `last_id` (inclus), y compris celles supprimées depuis.
+    """
+    points = ImpactPoint.objects.filter(related_model=model.__name__, related_id__gte=first_id)
+    sources = model.objects.filter(pk__gte=first_id)
+    if last_id is not None:
+        points = points.filter(related_id__lte=last_id)
+        sources = sources.filter(pk__lte=last_id)
+    projected = project_queryset(sources, batch_size=batch_size, update_clusters=update_clusters)
+    # Points dont la source n'existe plus
+    orphans = list(points.exclude(related_id__in=sources.values('pk')).values_list('related_id', flat=True).distinct())
+    if orphans:
+        with transaction.atomic():
+            projected += project(model, orphans, update_clusters=update_clusters)
+    return projected
+
+
+def drain_outbox(batch_size=OUTBOX_BATCH_SIZE, max_attempts=OUTBOX_MAX_ATTEMPTS):
+    """
+    Traiter un lot de l'outbox. Chaque modèle source est projeté dans un
+    point de sauvegarde distinct ; si la projection du groupe échoue, chaque
+    source est reprise seule et seules celles qui échouent encore sont
+    retentées plus tard. Retourne (lignes traitées, lignes en échec).
+    """
+    now = timezone.now()
+    # SKIP LOCKED (MySQL 8, MariaDB 10.6) : deux commandes se partagent les
+    # lignes ; sinon verrou simple, la seconde attend la fin du lot
+    skip_locked = connections[ImpactOutbox.objects.db].features.has_select_for_update_skip_locked
+    with transaction.atomic():
+        entries = list(
+            ImpactOutbox.objects
+            .filter(available_at__lte=now, attempts__lt=max_attempts)
+            .select_for_update(skip_locked=skip_locked)
+            .order_by('id')[:batch_size]
+        )
+        grouped = {}
+        for entry in entries:
+            grouped.setdefault(entry.source_model, []).append(entry)
+
+        done, failed = [], []
+        for model_name, group in grouped.items():
+            try:
+                _project_entries(model_name, group)
+            except Exception:
+                logger.exception("Échec de la projection %s, reprise source par source", model_name)
+            else:
+                done.extend(entry.pk for entry in group)
+                continue
+            # Une source fautive ne fait pas échouer les autres sources du groupe
+            by_source = {}
+            for entry in group:
+                by_source.setdefault(entry.source_id, []).append(entry)
+            for source_id, entries in by_source.items():
+                try:
+                    _project_entries(model_name, entries)
+                except Exception as error:
+                    logger.exception("Échec de la projection %s #%s", model_name, source_id)
+                    for entry in entries:
+                        entry.attempts += 1
+                        entry.available_at = now + OUTBOX_RETRY_DELAY * 2 ** (entry.attempts - 1)
+                        entry.last_error = f"{type(error).__name__}: {error}"
+                        failed.append(entry)
+                else:
+                    done.extend(entry.pk for entry in entries)
+
+        ImpactOutbox.objects.filter(pk__in=done).delete()
+        if failed:
+            ImpactOutbox.objects.bulk_update(failed, ['attempts', 'available_at', 'last_error'])
+    return len(done), len(failed)
+
+
+def _project_entries(model_name, entries):
+    """Projeter les sources des lignes `entries` dans un point de sauvegarde"""
+    with transaction.atomic():
+        project(PROJECTED_MODELS[model_name], [entry.source_id for entry in entries])
+
+
+def outbox_lag(max_attempts=OUTBOX_MAX_ATTEMPTS):
+    """Lignes en attente, âge de la plus ancienne (secondes) et lignes abandonnées"""
+    pending = ImpactOutbox.objects.filter(attempts__lt=max_attempts).aggregate(
+        count=Count('id'), oldest=Min('created_at'),
+    )
+    oldest = pending['oldest']
+    return {
+        'pending': pending['count'],
+        'lag_seconds': round((timezone.now() - oldest).total_seconds(), 1) if oldest else 0,
+        'dead': ImpactOutbox.objects.filter(attempts__gte=max_attempts).count(),
+    }
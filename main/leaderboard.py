@@ -0,0 +1,193 @@
+"""
+Classement des profils par points, servi depuis la table LeaderboardRank :
+le rang d'un profil est lu par sa clé et ses voisins par l'index sur
+`rank`, au lieu de compter à chaque affichage les profils mieux classés.
+
+Les classements de la semaine et du mois lisent PointsPeriodTotal, alimentée
+à partir du journal PointsLedger par `rollup_points` (commande du même nom).
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Min, Q
+from django.utils import timezone
+
+from .models import LeaderboardRank, PointsLedger, PointsPeriodTotal, UserProfile
+
+# Nombre de profils lus (et écrits) par lot lors de la reconstruction
+REFRESH_BATCH_SIZE = 1000
+# Nombre de lignes du journal des points agrégées par transaction
+ROLLUP_BATCH_SIZE = 5000
+
+
+def refresh_ranks(batch_size=REFRESH_BATCH_SIZE):
+    """Recalculer entièrement la table des rangs ; retourne le nombre de profils classés"""
+    ranks, last, position, rank, previous_points = [], None, 0, 0, None
+    profiles = UserProfile.objects.order_by('-points', 'id').values_list('id', 'points')
+    while True:
+        batch = profiles
+        if last is not None:
+            # Reprise après le dernier profil lu (ordre points décroissants, id croissant)
+            batch = batch.filter(points__lte=last[1]).exclude(points=last[1], id__lte=last[0])
+        batch = list(batch[:batch_size])
+        if not batch:
+            break
+        for profile_id, points in batch:
+            position += 1
+            if points != previous_points:
+                rank, previous_points = position, points
+            ranks.append(LeaderboardRank(profile_id=profile_id, points=points, rank=rank))
+        if len(batch) < batch_size:
+            break
+        last = batch[-1]
+
+    with transaction.atomic():
+        LeaderboardRank.objects.all().delete()
+        LeaderboardRank.objects.bulk_create(ranks, batch_size=batch_size)
+    return len(ranks)
+
+
+def record_points_change(profile, previous_points):
+    """
+    Répercuter sur la table des rangs le passage de `previous_points` à
+    `profile.points` : seuls les profils dépassés (ou rattrapés) changent
+    de rang.
+    """
+    points = profile.points
+    with transaction.atomic():
+        entry = LeaderboardRank.objects.select_for_update().filter(profile_id=profile.pk).first()
+        if entry is None:
+            _insert(profile.pk, points)
+            return
+        if entry.points != previous_points:
+            # Table en retard sur le profil : repartir de l'état qu'elle connaît
+            previous_points = entry.points
+        if points == previous_points:
+            return
+
+        others = LeaderboardRank.objects.exclude(profile_id=profile.pk)
+        if points > previous_points:
+            # Nouveau rang : celui du meilleur profil rattrapé ou dépassé
+            best = others.filter(points__gte=previous_points, points__lte=points).aggregate(rank=Min('rank'))['rank']
+            others.filter(points__gte=previous_points, points__lt=points).update(rank=F('rank') + 1)
+            entry.rank = best or entry.rank
+        else:
+            overtaken = others.filter(points__gt=points, points__lte=previous_points).count()
+            others.filter(points__gte=points, points__lt=previous_points).update(rank=F('rank') - 1)
+            entry.rank += overtaken
+        entry.points = points
+        entry.save(update_fields=['points', 'rank'])
+
+
+def record_profile_removal(profile_id):
+    """
+    Avant la suppression d'un profil (et de son rang, par cascade) : les
+    profils moins bien classés remontent d'une place. Les ex aequo gardent
+    leur rang.
+    """
+    with transaction.atomic():
+        entry = LeaderboardRank.objects.select_for_update().filter(profile_id=profile_id).first()
+        if entry is not None:
+            LeaderboardRank.objects.filter(points__lt=entry.points).update(rank=F('rank') - 1)
+            entry.delete()
+
+
+def _insert(profile_id, points):
+    if not LeaderboardRank.objects.exists():
+        # Table jamais construite (première mise en production) : calcul complet
+        refresh_ranks()
+        return LeaderboardRank.objects.get(profile_id=profile_id)
+    rank = LeaderboardRank.objects.filter(points__gt=points).count() + 1
+    LeaderboardRank.objects.filter(points__lt=points).update(rank=F('rank') + 1)
+    return LeaderboardRank.objects.create(profile_id=profile_id, points=points, rank=rank)
+
+
+def get_rank(profile, neighbours=2):
+    """
+    Rang du profil et profils classés autour de lui (`neighbours` de
+    chaque côté), sous la forme {'rank': ..., 'neighbours': [...]}.
+    """
+    entry = LeaderboardRank.objects.filter(profile_id=profile.pk).first()
+    if entry is None:
+        with transaction.atomic():
+            entry = _insert(profile.pk, profile.points)
+    if not neighbours:
+        return {'rank': entry.rank, 'neighbours': []}
+    around = (
+        LeaderboardRank.objects
+        .filter(rank__gte=max(entry.rank - neighbours, 1), rank__lte=entry.rank + neighbours)
+        .select_related('profile__user')
+        .order_by('rank', 'profile_id')
+    )
+    return {'rank': entry.rank, 'neighbours': list(around)}
+
+
+def period_start(period, moment=None):
+    """Premier jour (heure locale) de la semaine (lundi) ou du mois contenant `moment`"""
+    day = timezone.localtime(moment or timezone.now()).date()
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def rollup_points(batch_size=ROLLUP_BATCH_SIZE):
+    """
+    Agréger dans PointsPeriodTotal les lignes du journal des points pas
+    encore comptées. Chaque lot est verrouillé, agrégé et marqué `rolled_up`
+    dans une même transaction : une interruption reprend sans double
+    comptage, et une ligne validée après un lot d'id supérieur est reprise
+    au passage suivant. Retourne le nombre de lignes agrégées.
+    """
+    processed = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                PointsLedger.objects.select_for_update().filter(rolled_up=False)
+                .order_by('id').values_list('id', 'user_id', 'points', 'created_at')[:batch_size]
+            )
+            if not rows:
+                break
+            totals = defaultdict(int)
+            for _, user_id, points, created_at in rows:
+                for period, _label in PointsPeriodTotal.PERIOD_CHOICES:
+                    totals[(period, period_start(period, created_at), user_id)] += points
+            _apply_period_totals(totals)
+            PointsLedger.objects.filter(id__in=[row[0] for row in rows]).update(rolled_up=True)
+        processed += len(rows)
+        if len(rows) < batch_size:
+            break
+    return processed
+
+
+def _apply_period_totals(totals):
+    keys = Q()
+    for period, start in {(period, start) for period, start, _ in totals}:
+        keys |= Q(period=period, period_start=start)
+    existing = {
+        (row.period, row.period_start, row.user_id): row
+        for row in PointsPeriodTotal.objects.select_for_update().filter(
+            keys, user_id__in={user_id for _, _, user_id in totals}
+        )
+    }
+    to_update, to_create = [], []
+    for key, points in totals.items():
+        row = existing.get(key)
+        if row is None:
+            period, start, user_id = key
+            to_create.append(PointsPeriodTotal(period=period, period_start=start, user_id=user_id, points=points))
+        else:
+            row.points += points
+            to_update.append(row)
+    PointsPeriodTotal.objects.bulk_update(to_update, ['points'], batch_size=1000)
+    PointsPeriodTotal.objects.bulk_create(to_create, batch_size=1000)
+
+
+def get_period_leaderboard(period, limit=10):
+    """Meilleurs totaux de la semaine ou du mois en cours"""
+    return list(
+        PointsPeriodTotal.objects
+        .filter(period=period, period_start=period_start(period), points__gt=0)
+        .select_related('user')
+        .order_by('-points', 'user_id')[:limit]
+    )
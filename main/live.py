@@ -0,0 +1,160 @@
+"""
+Flux Server-Sent Events de la carte d'impact.
+
+Servi uniquement par l'application ASGI (aimesite/asgi.py) : sous WSGI
+(Passenger), une connexion ouverte bloquerait un worker entier. Un seul
+diffuseur par processus interroge la base à chaque intervalle et relaie
+les nouveautés à tous les clients connectés : N clients coûtent une
+requête par intervalle, pas N.
+"""
+import asyncio
+import json
+import logging
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from .impact_map import current_cursor, get_changes_since, point_to_dict
+from .utils import get_map_statistics
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = '/api/impact-stream/'
+# Intervalle (secondes) entre deux interrogations de la base
+POLL_INTERVAL = 5
+# Commentaire envoyé aux clients inactifs pour garder la connexion ouverte
+KEEPALIVE_INTERVAL = 15
+# Messages en attente par client avant de le considérer comme trop lent
+CLIENT_QUEUE_SIZE = 100
+
+
+def format_event(event, data):
+    """Message SSE sérialisé"""
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+class ImpactBroadcaster:
+    """Diffuseur partagé : une tâche d'interrogation tant qu'un client est connecté"""
+
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.subscribers = set()
+        self.cursor = None
+        self.last_stats = None
+        self.task = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers:
+            self.stop()
+
+    def stop(self):
+        """Plus aucun abonné : arrêter l'interrogation et oublier la position"""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        # Le prochain abonné part des nouveautés à venir, sans rejouer
+        # celles survenues pendant que personne n'était connecté
+        self.cursor = None
+        self.last_stats = None
+
+    def publish(self, message):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Client trop lent : il est déconnecté (None) et se reconnectera
+                self.subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait(None)
+        if not self.subscribers:
+            self.stop()
+
+    async def run(self):
+        while self.subscribers:
+            try:
+                # Position appliquée ici, pas dans le thread : une interrogation
+                # encore en cours après stop() ne la réinstalle pas
+                messages, self.cursor, self.last_stats = await sync_to_async(self.poll)(self.cursor, self.last_stats)
+                for message in messages:
+                    self.publish(message)
+            except Exception:
+                logger.exception("Échec de l'interrogation du flux de la carte")
+            await asyncio.sleep(self.interval)
+
+    def poll(self, cursor, last_stats):
+        """
+        Lire les nouveautés depuis `cursor` (exécuté hors de la boucle asyncio).
+        Retourne (messages, nouveau curseur, dernières statistiques). Les points
+        de la fenêtre de sécurité du flux sont rediffusés ; le client les dédoublonne.
+        """
+        close_old_connections()
+        messages = []
+        if cursor is None:
+            return messages, current_cursor(), get_map_statistics()
+
+        has_more = True
+        while has_more:
+            points, cursor, has_more = get_changes_since(cursor)
+            if points:
+                messages.append(format_event('impact', [point_to_dict(point) for point in points]))
+
+        stats = get_map_statistics()
+        if stats != last_stats:
+            messages.append(format_event('stats', stats))
+        return messages, cursor, stats
+
+
+broadcaster = ImpactBroadcaster()
+
+
+async def impact_stream_app(scope, receive, send):
+    """Application ASGI du flux SSE"""
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': b'retry: 10000\n\n', 'more_body': True})
+
+    queue = broadcaster.subscribe()
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        while True:
+            message = asyncio.ensure_future(queue.get())
+            done, pending = await asyncio.wait(
+                {message, disconnect}, timeout=KEEPALIVE_INTERVAL, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnect in done:
+                message.cancel()
+                return
+            if message in done:
+                body = message.result()
+                if body is None:
+                    break
+            else:
+                message.cancel()
+                body = ': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        disconnect.cancel()
+        broadcaster.unsubscribe(queue)
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
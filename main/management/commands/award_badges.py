@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from main.badge_rules import evaluate_rules
+
+
+class Command(BaseCommand):
+    help = 'Attribue les badges selon les règles (utilisateurs en file depuis le dernier passage)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help="Réexaminer tout l'historique au lieu des seuls utilisateurs en file",
+        )
+
+    def handle(self, *args, **options):
+        awarded = evaluate_rules(full=options['full'])
+        for badge, count in awarded.items():
+            self.stdout.write(f'✓ {badge}: {count} badge(s) attribué(s)')
+        self.stdout.write(self.style.SUCCESS(f'✅ {sum(awarded.values())} badge(s) attribué(s)'))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from main.models import ImpactPoint, UserProfile
+from main.utils import rebuild_site_statistics
+
+
+class Command(BaseCommand):
+    help = 'Calcule la colonne geohash des ImpactPoint et UserProfile existants'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Nombre de lignes mises à jour par lot',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        for model in (ImpactPoint, UserProfile):
+            updated = 0
+            last_id = 0
+            while True:
+                # Reprise naturelle : seules les lignes sans geohash sont relues
+                batch = list(
+                    model.objects.filter(
+                        id__gt=last_id,
+                        geohash='',
+                        latitude__isnull=False,
+                        longitude__isnull=False,
+                    ).only('id', 'latitude', 'longitude').order_by('id')[:batch_size]
+                )
+                if not batch:
+                    break
+                for instance in batch:
+                    instance.update_geohash()
+                model.objects.bulk_update(batch, ['geohash'])
+                updated += len(batch)
+                last_id = batch[-1].id
+            self.stdout.write(f'✓ {model.__name__}: {updated} geohash calculés')
+
+        # Les zones distinctes (quartiers impactés) sont comptées sur le geohash
+        drift = rebuild_site_statistics()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Geohash à jour ({len(drift)} compteur(s) de statistiques corrigé(s))'
+        ))
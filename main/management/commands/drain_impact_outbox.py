@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from main.impact_projection import OUTBOX_BATCH_SIZE, drain_outbox, outbox_lag
+
+
+class Command(BaseCommand):
+    help = "Projette sur ImpactPoint les modifications en attente dans l'outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=OUTBOX_BATCH_SIZE,
+            help="Nombre de lignes d'outbox traitées par transaction",
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help="Continuer à surveiller l'outbox au lieu de s'arrêter une fois vide",
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Pause (secondes) entre deux passages en mode --loop',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        while True:
+            processed = failed = 0
+            while True:
+                done, errors = drain_outbox(batch_size=batch_size)
+                processed += done
+                failed += errors
+                if done + errors < batch_size:
+                    break
+
+            lag = outbox_lag()
+            if processed or failed or not options['loop']:
+                message = (
+                    f"{processed} ligne(s) projetée(s), {failed} en échec - "
+                    f"en attente : {lag['pending']} (retard {lag['lag_seconds']} s), abandonnées : {lag['dead']}"
+                )
+                self.stdout.write(self.style.SUCCESS(f'✅ {message}') if not failed else self.style.WARNING(f'⚠️ {message}'))
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
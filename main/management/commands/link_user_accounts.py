@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from main.badge_rules import queue_checks
+from main.dashboard_cache import invalidate_dashboards
+from main.models import Donation
+from main.onboarding import LINKED_MODELS
+from main.utils import account_ids_by_email
+
+
+class Command(BaseCommand):
+    help = 'Rattache les dons et inscriptions MBC sans compte à l\'utilisateur de même email'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Nombre de lignes examinées par transaction',
+        )
+
+    def handle(self, *args, **options):
+        for model, email_field in LINKED_MODELS:
+            linked = self.link(model, email_field, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'✅ {model.__name__} : {linked} lignes rattachées'))
+
+    def link(self, model, email_field, batch_size):
+        # Parcours par clé : les lignes sans compte correspondant restent
+        # sans compte et ne sont pas réexaminées dans ce passage
+        unlinked = model.objects.filter(user__isnull=True).order_by('id')
+        linked = examined = 0
+        last_id = 0
+        while True:
+            batch = list(unlinked.filter(id__gt=last_id).only('id', email_field)[:batch_size])
+            if not batch:
+                break
+            accounts = account_ids_by_email(getattr(row, email_field) for row in batch)
+            rows = []
+            for row in batch:
+                row.user_id = accounts.get(getattr(row, email_field))
+                if row.user_id:
+                    rows.append(row)
+            if rows:
+                with transaction.atomic():
+                    model.objects.bulk_update(rows, ['user'])
+                    # bulk_update n'émet pas post_save
+                    invalidate_dashboards(row.user_id for row in rows)
+                    if model is Donation:
+                        # Dons complétés désormais comptés pour les badges
+                        queue_checks(row.user_id for row in rows)
+            linked += len(rows)
+            examined += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'✓ {model.__name__} : {examined} lignes examinées')
+            if len(batch) < batch_size:
+                break
+        return linked
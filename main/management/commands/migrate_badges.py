@@ -0,0 +1,54 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from main.models import UserBadge, UserProfile
+
+
+class Command(BaseCommand):
+    help = 'Transfère les badges JSON de UserProfile.badges vers la table UserBadge'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Nombre de profils migrés par transaction',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        migrated = badges = 0
+        last_id = 0
+        while True:
+            # Reprise naturelle : un profil migré a son champ JSON vidé
+            batch = list(
+                UserProfile.objects.filter(id__gt=last_id)
+                .exclude(badges__in=['', '[]'])
+                .only('id', 'user_id', 'badges').order_by('id')[:batch_size]
+            )
+            if not batch:
+                break
+            rows, done = [], []
+            for profile in batch:
+                try:
+                    names = json.loads(profile.badges)
+                except ValueError:
+                    names = None
+                if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+                    self.stdout.write(self.style.WARNING(f'⚠️ Profil {profile.id} : JSON invalide, ignoré'))
+                    continue
+                rows.extend(UserBadge(user_id=profile.user_id, badge=name) for name in dict.fromkeys(names))
+                done.append(profile.id)
+            # Badges insérés et JSON vidé dans la même transaction : une
+            # interruption laisse chaque profil soit migré, soit intact
+            with transaction.atomic():
+                UserBadge.objects.bulk_create(rows, ignore_conflicts=True)
+                UserProfile.objects.filter(id__in=done).update(badges='[]')
+            migrated += len(batch)
+            badges += len(rows)
+            last_id = batch[-1].id
+            self.stdout.write(f'✓ {migrated} profils traités')
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {badges} badges migrés vers UserBadge'))
+
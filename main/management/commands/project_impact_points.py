@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from main.impact_map import rebuild_clusters
+from main.impact_projection import PROJECTED_MODELS, PROJECTION_BATCH_SIZE, project_range
+
+
+class Command(BaseCommand):
+    help = 'Recalcule les ImpactPoint des dons, participations et contributions (après une opération en masse)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            choices=sorted(PROJECTED_MODELS),
+            action='append',
+            help='Modèle source à projeter (par défaut : tous)',
+        )
+        parser.add_argument('--from-id', type=int, default=0, help='Premier id de source (inclus)')
+        parser.add_argument('--to-id', type=int, default=None, help='Dernier id de source (inclus)')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=PROJECTION_BATCH_SIZE,
+            help='Nombre de sources recalculées par transaction',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for name in options['model'] or sorted(PROJECTED_MODELS):
+            # Regroupements de la carte recalculés une fois à la fin
+            projected = project_range(
+                PROJECTED_MODELS[name], options['from_id'], options['to_id'],
+                batch_size=options['batch_size'], update_clusters=False,
+            )
+            total += projected
+            self.stdout.write(f'✓ {name}: {projected} point(s) créé(s), modifié(s) ou supprimé(s)')
+        cells = rebuild_clusters()
+        self.stdout.write(f'✓ {cells} cellules de la carte recalculées')
+        self.stdout.write(self.style.SUCCESS(f'✅ Projection terminée ({total} point(s) modifié(s))'))
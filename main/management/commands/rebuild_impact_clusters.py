@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from main.impact_map import rebuild_clusters
+
+
+class Command(BaseCommand):
+    help = 'Recalcule les regroupements (ImpactCluster) de la carte interactive'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recalcul des regroupements de la carte...')
+        cells = rebuild_clusters()
+        self.stdout.write(self.style.SUCCESS(f'✅ {cells} cellules recalculées'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from main.utils import rebuild_site_statistics
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit l\'instantané SiteStatistics depuis zéro et signale les écarts'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recalcul des statistiques du site...')
+        drift = rebuild_site_statistics()
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('✅ Instantané à jour, aucun écart détecté'))
+            return
+
+        self.stdout.write(self.style.WARNING(f'⚠️ {len(drift)} compteur(s) corrigé(s) :'))
+        for name, (stored, actual) in drift.items():
+            self.stdout.write(f'  {name}: {stored} → {actual}')
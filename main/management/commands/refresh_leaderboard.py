@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from main.leaderboard import REFRESH_BATCH_SIZE, refresh_ranks
+
+
+class Command(BaseCommand):
+    help = 'Recalcule la table des rangs du classement (à planifier, par exemple toutes les heures)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=REFRESH_BATCH_SIZE,
+            help='Nombre de profils lus et écrits par lot',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recalcul du classement...')
+        ranked = refresh_ranks(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {ranked} profils classés'))
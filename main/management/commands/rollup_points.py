@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from main.leaderboard import ROLLUP_BATCH_SIZE, rollup_points
+
+
+class Command(BaseCommand):
+    help = 'Agrège le journal des points en totaux hebdomadaires et mensuels (classements périodiques)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=ROLLUP_BATCH_SIZE,
+            help='Nombre de lignes du journal agrégées par transaction',
+        )
+
+    def handle(self, *args, **options):
+        processed = rollup_points(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {processed} ligne(s) du journal des points agrégée(s)'))
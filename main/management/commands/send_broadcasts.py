@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from main.broadcasts import BROADCAST_CHUNK_SIZE, send_pending_broadcasts
+
+
+class Command(BaseCommand):
+    help = 'Envoie les notifications des diffusions en file (NotificationBroadcast)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=BROADCAST_CHUNK_SIZE,
+            help='Nombre de destinataires servis par transaction',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help="Continuer à surveiller la file au lieu de s'arrêter une fois vide",
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=10,
+            help='Pause (secondes) entre deux passages en mode --loop',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent = send_pending_broadcasts(chunk_size=options['chunk_size'], progress=self.report)
+            if sent or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'✅ {sent} notification(s) envoyée(s)'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def report(self, broadcast):
+        self.stdout.write(
+            f'✓ « {broadcast.title} » : {broadcast.sent_count}/{broadcast.total_recipients} ({broadcast.progress} %)'
+        )
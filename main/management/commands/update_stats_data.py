@@ -8,6 +8,9 @@ from main.models import (
     MBCParticipant, MutotoBikeChallenge, EventParticipation,
     StaffContribution, ImpactPoint
 )
+from main.impact_map import invalidate_tiles, rebuild_clusters
+from main.impact_projection import PROJECTED_MODELS, project_queryset
+from main.utils import rebuild_site_statistics
 
 class Command(BaseCommand):
     help = 'Met à jour les données d\'exemple pour les statistiques dynamiques'
@@ -30,9 +33,10 @@ class Command(BaseCommand):
         self.stdout.write('Création des données d\'exemple...')
 
         # 1. Créer des donations pour avoir des FC collectés
+        # (insertion en masse : les ImpactPoint sont projetés en fin de commande)
         if not Donation.objects.exists():
-            for i in range(50):
-                Donation.objects.create(
+            Donation.objects.bulk_create([
+                Donation(
                     donor_name=f'Donateur {i+1}',
                     donor_email=f'donateur{i+1}@exemple.com',
                     amount=random.randint(5000, 50000),  # 5,000 à 50,000 FC
@@ -40,6 +44,8 @@ class Command(BaseCommand):
                     status='completed',
                     created_at=timezone.now() - timedelta(days=random.randint(1, 365))
                 )
+                for i in range(50)
+            ])
             self.stdout.write(f'✓ {Donation.objects.count()} donations créées')
 
         # 2. Créer des profils utilisateurs pour les enfants et familles
@@ -116,8 +122,8 @@ class Command(BaseCommand):
                 )
                 
                 # Ajouter des participants
-                for j in range(random.randint(30, 80)):
-                    MBCParticipant.objects.create(
+                MBCParticipant.objects.bulk_create([
+                    MBCParticipant(
                         event=mbc,
                         participant_name=f'Participant {j+1}',
                         participant_email=f'participant{j+1}@exemple.com',
@@ -127,6 +133,8 @@ class Command(BaseCommand):
                         emergency_phone=f'+243{random.randint(800000000, 999999999)}',
                         status='confirmed'
                     )
+                    for j in range(random.randint(30, 80))
+                ])
             
             self.stdout.write(f'✓ {MBCParticipant.objects.filter(status="confirmed").count()} participants MBC confirmés')
 
@@ -158,35 +166,53 @@ class Command(BaseCommand):
             self.stdout.write(f'✓ {Project.objects.filter(status="active").count()} projets actifs')
 
         # 7. Créer des points d'impact géographiques
+        # (insertion en masse : regroupements de la carte recalculés en fin de commande)
         if ImpactPoint.objects.count() < 10:
-            for i in range(25):
-                ImpactPoint.objects.create(
+            points = [
+                ImpactPoint(
                     type=random.choice(['donation', 'event', 'participation', 'project']),
                     related_id=random.randint(1, 10),
                     related_model='Project',
-                    latitude=-4.3317 + random.uniform(-0.2, 0.2),
-                    longitude=15.3139 + random.uniform(-0.2, 0.2),
+                    latitude=round(-4.3317 + random.uniform(-0.2, 0.2), 6),
+                    longitude=round(15.3139 + random.uniform(-0.2, 0.2), 6),
                     description=f'Point d\'impact {i+1}',
                     value=random.randint(1000, 50000),
                     status='active'
                 )
+                for i in range(25)
+            ]
+            for point in points:
+                point.update_geohash()
+            ImpactPoint.objects.bulk_create(points)
+            invalidate_tiles([(None, point.tracked_values()) for point in points])
             self.stdout.write(f'✓ {ImpactPoint.objects.count()} points d\'impact créés')
 
         # 8. Créer des contributions du staff
         staff_users = User.objects.filter(is_staff=True)
         if staff_users.exists() and StaffContribution.objects.count() < 5:
-            for i in range(12):  # 12 mois de contributions
-                for staff in staff_users[:3]:  # 3 membres du staff
-                    StaffContribution.objects.create(
-                        staff=staff,
-                        amount=random.randint(10000, 30000),
-                        month=f'2024-{i+1:02d}',
-                        object=f'Contribution mensuelle {i+1}/2024',
-                        is_recorded=True,
-                        validated_by=staff_users.first() if staff_users.count() > 1 else None
-                    )
+            validated_by = staff_users.first() if staff_users.count() > 1 else None
+            StaffContribution.objects.bulk_create([
+                StaffContribution(
+                    staff=staff,
+                    amount=random.randint(10000, 30000),
+                    month=f'2024-{i+1:02d}',
+                    object=f'Contribution mensuelle {i+1}/2024',
+                    is_recorded=True,
+                    validated_by=validated_by
+                )
+                for i in range(12)  # 12 mois de contributions
+                for staff in staff_users[:3]  # 3 membres du staff
+            ])
             self.stdout.write(f'✓ {StaffContribution.objects.count()} contributions du staff')
 
+        # bulk_create n'émet pas post_save : projection des ImpactPoint (dons,
+        # participations, contributions), regroupements de la carte recalculés
+        # une seule fois et statistiques recalculées en quelques requêtes
+        for model in PROJECTED_MODELS.values():
+            project_queryset(model.objects.all(), update_clusters=False)
+        rebuild_clusters()
+        rebuild_site_statistics()
+
         self.stdout.write(
             self.style.SUCCESS('✅ Données d\'exemple créées avec succès!')
         )
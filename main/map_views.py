@@ -2,13 +2,13 @@
 Vues pour la carte interactive d'impact social AIME
 """
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_GET, require_POST
 from django.views.generic import TemplateView
+from django.utils.cache import patch_cache_control
 import json
-import random
-from datetime import datetime, timedelta
 from django.db import models
 
 class InteractiveMapView(TemplateView):
@@ -16,54 +16,171 @@ class InteractiveMapView(TemplateView):
     template_name = 'main/interactive_map.html'
     
     def get_context_data(self, **kwargs):
-        from main.models import ImpactPoint, Event, Donation, Project, UserProfile
+        from main.models import ImpactPoint
+        from main.utils import get_map_statistics
+        from main.live import STREAM_PATH
+        from main.impact_map import MAX_CLUSTER_ZOOM, MAX_TILE_ZOOM, current_cursor, point_to_dict
         context = super().get_context_data(**kwargs)
         context['title'] = "Carte Interactive de l'Impact Social AIME"
-        # Stats dynamiques
-        context['stats'] = {
-            'total_beneficiaries': UserProfile.objects.count(),
-            'total_events': Event.objects.count(),
-            'total_donations': Donation.objects.filter(status='completed').aggregate(total=models.Sum('amount'))['total'] or 0,
-            'active_projects': Project.objects.filter(status='active').count(),
-            'volunteers': UserProfile.objects.filter(role='volunteer').count(),
-        }
-        # Points d'impact réels
-        impact_points = ImpactPoint.objects.all()
-        impact_data = []
-        for point in impact_points:
-            impact_data.append({
-                'id': point.id,
-                'title': point.description or point.type,
-                'description': point.description,
-                'type': point.type,
-                'lat': float(point.latitude) if point.latitude else None,
-                'lng': float(point.longitude) if point.longitude else None,
-                'impact_value': float(point.value) if point.value else None,
-                'date': point.created_at.strftime('%Y-%m-%d'),
-                'status': point.status,
-            })
-        context['impact_data'] = json.dumps(impact_data)
+        # Stats dynamiques (partagées avec la page d'accueil via le cache)
+        context['stats'] = get_map_statistics()
+        # Les points sont chargés par tuiles ; seule la timeline est pré-remplie
+        recent_points = ImpactPoint.objects.order_by('-created_at')[:10]
+        context['recent_impacts'] = [point_to_dict(point) for point in recent_points]
+        context['max_cluster_zoom'] = MAX_CLUSTER_ZOOM
+        context['max_tile_zoom'] = MAX_TILE_ZOOM
+        context['impact_cursor'] = current_cursor()
+        context['impact_stream_url'] = STREAM_PATH
         return context
 
+def _impact_filters(request):
+    """Filtres type/status d'une requête de carte ; (type, statut, message d'erreur)"""
+    from main.models import ImpactPoint
+    point_type = request.GET.get('type') or None
+    status = request.GET.get('status') or None
+    if point_type and point_type not in dict(ImpactPoint.TYPE_CHOICES):
+        return None, None, 'Type inconnu'
+    if status and status not in dict(ImpactPoint.STATUS_CHOICES):
+        return None, None, 'Statut inconnu'
+    return point_type, status, None
+
+def impact_clusters(request):
+    """API des regroupements de points d'impact pour un zoom et une emprise"""
+    from main.geo import parse_bbox
+    from main.impact_map import MAX_CLUSTER_ZOOM, get_clusters, get_points
+    try:
+        zoom = int(request.GET.get('zoom', ''))
+        bbox = parse_bbox(request.GET.get('bbox', ''))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Paramètres zoom/bbox invalides'}, status=400)
+    point_type, status, error = _impact_filters(request)
+    if error:
+        return JsonResponse({'status': 'error', 'message': error}, status=400)
+    
+    if zoom > MAX_CLUSTER_ZOOM:
+        return JsonResponse({'status': 'success', 'zoom': zoom, 'clusters': [], 'points': get_points(bbox, point_type, status)})
+    # Les regroupements agrègent tous les points : un filtre ne peut pas y être appliqué
+    if point_type or status:
+        return JsonResponse({'status': 'error', 'message': 'Filtres disponibles à partir du zoom %d' % (MAX_CLUSTER_ZOOM + 1)}, status=400)
+    return JsonResponse({'status': 'success', 'zoom': max(zoom, 0), 'clusters': get_clusters(max(zoom, 0), bbox), 'points': []})
+
+def _impact_tile_etag(request, z, x, y):
+    from main.impact_map import tile_version
+    return f"{tile_version(z, x, y)}-{request.GET.get('type', '')}-{request.GET.get('status', '')}"
+
+@condition(etag_func=_impact_tile_etag)
+def impact_tile(request, z, x, y):
+    """API des tuiles GeoJSON z/x/y de points d'impact (filtres : type, status)"""
+    from main.impact_map import MIN_TILE_ZOOM, MAX_TILE_ZOOM, get_tile
+    if not (MIN_TILE_ZOOM <= z <= MAX_TILE_ZOOM and x < 2 ** z and y < 2 ** z):
+        return JsonResponse({'status': 'error', 'message': 'Tuile hors des zooms servis'}, status=400)
+    
+    point_type, status, error = _impact_filters(request)
+    if error:
+        return JsonResponse({'status': 'error', 'message': error}, status=400)
+    
+    response = JsonResponse(get_tile(z, x, y, point_type, status))
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
+def _impact_export_last_modified(request):
+    """Dernière création, modification ou suppression d'un point"""
+    from main.models import ImpactPoint
+    from main.impact_map import last_point_deletion
+    last_change = ImpactPoint.objects.aggregate(last=models.Max('updated_at'))['last']
+    last_deletion = last_point_deletion()
+    return max(last_change, last_deletion) if last_change else last_deletion
+
+@require_GET
+@gzip_page
+@condition(last_modified_func=_impact_export_last_modified)
+def export_impact_geojson(request):
+    """Export GeoJSON complet des points d'impact, envoyé en flux (partenaires)"""
+    from main.models import ImpactPoint
+    from main.impact_map import stream_geojson
+    response = StreamingHttpResponse(
+        stream_geojson(ImpactPoint.objects.all()),
+        content_type='application/geo+json',
+    )
+    response['Content-Disposition'] = 'attachment; filename="aime-impact-points.geojson"'
+    return response
+
 def get_impact_data(request):
-    """API pour données temps réel"""
-    data = {
-        'id': random.randint(1000, 9999),
-        'title': 'Nouvelle Activité',
-        'type': 'event',
-        'lat': -4.4419,
-        'lng': 15.2663,
-        'impact_value': 10,
-        'date': datetime.now().strftime('%Y-%m-%d')
-    }
-    return JsonResponse({'status': 'success', 'data': [data]})
+    """
+    API du flux incrémental : points créés ou modifiés depuis le curseur.
+    Réponse 204 (sans corps) quand rien n'a changé, pour un sondage peu coûteux.
+    Les points récents sont renvoyés tant qu'ils sont dans la fenêtre de
+    sécurité (CHANGES_SAFETY_WINDOW) : le client les dédoublonne.
+    """
+    from main.impact_map import current_cursor, get_changes_since, point_to_dict
+    cursor = request.GET.get('cursor')
+    if not cursor:
+        return JsonResponse({'status': 'success', 'data': [], 'cursor': current_cursor(), 'has_more': False})
+    
+    try:
+        points, next_cursor, has_more = get_changes_since(cursor)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Curseur invalide'}, status=400)
+    
+    if not points:
+        return HttpResponse(status=204)
+    return JsonResponse({
+        'status': 'success',
+        'data': [point_to_dict(point) for point in points],
+        'cursor': next_cursor,
+        'has_more': has_more,
+    })
+
+def _impact_rows(request):
+    """
+    Lignes (numéro, données) du corps de la requête : un objet JSON, un
+    tableau JSON, ou un flux NDJSON (un objet par ligne) lu au fil de l'eau.
+    """
+    content_type = request.content_type or ''
+    if content_type in ('application/x-ndjson', 'application/jsonl'):
+        row = 0
+        for line in request:
+            line = line.strip()
+            if not line:
+                continue
+            row += 1
+            try:
+                yield row, json.loads(line)
+            except ValueError:
+                yield row, None
+        return
 
-@csrf_exempt
+    payload = json.loads(request.body)
+    if isinstance(payload, dict):
+        payload = [payload]
+    if not isinstance(payload, list):
+        raise ValueError('Objet ou tableau JSON attendu')
+    yield from enumerate(payload, start=1)
+
+@require_POST
 def add_impact_point(request):
-    """API pour ajouter impact"""
-    if request.method == 'POST':
-        return JsonResponse({'status': 'success', 'message': 'Ajouté'})
-    return JsonResponse({'status': 'error'})
+    """
+    API d'import en lot de points d'impact (JSON ou NDJSON).
+    Les lignes invalides sont signalées sans interrompre l'import.
+    Erreurs d'accès en JSON (401, 403) plutôt qu'une redirection vers la
+    page de connexion, inutilisable par un client d'API.
+    """
+    from main.impact_map import ingest_points
+    if not request.user.is_authenticated:
+        return JsonResponse({'status': 'error', 'message': 'Authentification requise'}, status=401)
+    if not request.user.has_perm('main.add_impactpoint'):
+        return JsonResponse({'status': 'error', 'message': 'Permission refusée'}, status=403)
+
+    try:
+        created, errors = ingest_points(_impact_rows(request))
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Corps JSON invalide'}, status=400)
+
+    return JsonResponse({
+        'status': 'error' if errors and not created else 'success',
+        'created': created,
+        'errors': errors,
+    }, status=201 if created else 200)
 
 @login_required
 def gamification_dashboard(request):
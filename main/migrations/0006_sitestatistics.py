@@ -0,0 +1,37 @@
+# Generated by Django 4.2.14 on 2026-10-18 20:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_impactpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_donations', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('children_profiles', models.IntegerField(default=0)),
+                ('mbc_participants', models.IntegerField(default=0)),
+                ('active_projects', models.IntegerField(default=0)),
+                ('total_events', models.IntegerField(default=0)),
+                ('formations_dispensed', models.IntegerField(default=0)),
+                ('families_supported', models.IntegerField(default=0)),
+                ('user_locations', models.IntegerField(default=0)),
+                ('impact_locations', models.IntegerField(default=0)),
+                ('staff_contributions', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('event_participations', models.IntegerField(default=0)),
+                ('total_users', models.IntegerField(default=0)),
+                ('total_volunteers', models.IntegerField(default=0)),
+                ('total_donors', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Site Statistics',
+            },
+        ),
+    ]
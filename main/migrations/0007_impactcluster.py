@@ -0,0 +1,29 @@
+# Generated by Django 4.2.14 on 2026-10-18 20:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_sitestatistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImpactCluster',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zoom', models.PositiveSmallIntegerField()),
+                ('cell_x', models.IntegerField()),
+                ('cell_y', models.IntegerField()),
+                ('point_count', models.IntegerField(default=0)),
+                ('value_sum', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('latitude_sum', models.FloatField(default=0)),
+                ('longitude_sum', models.FloatField(default=0)),
+            ],
+            options={
+                'unique_together': {('zoom', 'cell_x', 'cell_y')},
+            },
+        ),
+    ]
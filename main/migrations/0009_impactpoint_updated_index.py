@@ -0,0 +1,17 @@
+# Generated by Django 4.2.14 on 2026-10-18 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_geohash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='impactpoint',
+            index=models.Index(fields=['updated_at', 'id'], name='main_impact_updated_idx'),
+        ),
+    ]
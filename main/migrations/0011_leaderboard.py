@@ -0,0 +1,27 @@
+# Generated by Django 4.2.14 on 2026-10-18 20:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_impactoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardRank',
+            fields=[
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='leaderboard_rank', serialize=False, to='main.userprofile')),
+                ('points', models.IntegerField(db_index=True)),
+                ('rank', models.PositiveIntegerField(db_index=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='points',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.14 on 2026-10-18 20:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0011_leaderboard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserBadge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('badge', models.CharField(db_index=True, max_length=50)),
+                ('awarded_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_badges', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['awarded_at', 'id'],
+                'unique_together': {('user', 'badge')},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.14 on 2026-10-18 20:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0014_points_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='donation',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='donations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='mbcparticipant',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mbc_participations', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.14 on 2026-10-18 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_donation_mbcparticipant_user'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='donation',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='main_donation_user_page_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['user', '-timestamp', '-id'], name='main_activity_user_page_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usernotification',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='main_notif_user_page_idx'),
+        ),
+    ]
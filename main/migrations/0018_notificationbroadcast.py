@@ -0,0 +1,40 @@
+# Generated by Django 4.2.14 on 2026-10-18 20:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0017_userprofile_unread_notifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationBroadcast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('message', models.TextField()),
+                ('notification_type', models.CharField(choices=[('info', 'Information'), ('success', 'Succès'), ('warning', 'Avertissement'), ('error', 'Erreur'), ('badge', 'Nouveau badge'), ('event', 'Événement'), ('donation', 'Don'), ('message', 'Message')], default='info', max_length=20)),
+                ('link_url', models.URLField(blank=True, null=True)),
+                ('role', models.CharField(blank=True, choices=[('member', 'Membre'), ('volunteer', 'Bénévole'), ('staff', 'Personnel'), ('partner', 'Partenaire'), ('donor', 'Donateur'), ('child', 'Enfant'), ('parent', 'Parent')], max_length=20)),
+                ('language', models.CharField(blank=True, choices=[('fr', 'Français'), ('en', 'English')], max_length=10)),
+                ('newsletter_only', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('draft', 'Brouillon'), ('pending', "En attente d'envoi"), ('sending', "En cours d'envoi"), ('sent', 'Envoyée')], db_index=True, default='draft', max_length=20)),
+                ('total_recipients', models.IntegerField(default=0)),
+                ('sent_count', models.IntegerField(default=0)),
+                ('last_user_id', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.14 on 2026-10-18 20:40
+
+from django.db import migrations, models
+
+
+def fill_counters(apps, schema_editor):
+    # Instantané existant : initialiser les nouveaux compteurs
+    SiteStatistics = apps.get_model('main', 'SiteStatistics')
+    SiteStatistics.objects.filter(pk=1).update(
+        total_profiles=apps.get_model('main', 'UserProfile').objects.count(),
+        all_events=apps.get_model('main', 'Event').objects.count(),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0019_create_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitestatistics',
+            name='all_events',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sitestatistics',
+            name='total_profiles',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.14 on 2026-10-18 20:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0021_badgecheck'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='impactpoint',
+            name='status',
+            field=models.CharField(blank=True, choices=[('pending', 'En attente'), ('active', 'Actif'), ('completed', 'Complété'), ('confirmed', 'Confirmé'), ('attended', 'Présent')], max_length=30),
+        ),
+    ]
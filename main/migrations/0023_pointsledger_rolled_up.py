@@ -0,0 +1,32 @@
+# Generated by Django 4.2.14 on 2026-10-18 20:45
+
+from django.db import migrations, models
+
+
+def mark_rolled_up(apps, schema_editor):
+    # Lignes déjà agrégées par l'ancienne position (Watermark)
+    Watermark = apps.get_model('main', 'Watermark')
+    PointsLedger = apps.get_model('main', 'PointsLedger')
+    last_id = Watermark.objects.filter(name='points_ledger:rollup').values_list('value', flat=True).first()
+    if last_id:
+        PointsLedger.objects.filter(id__lte=last_id).update(rolled_up=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0022_impactpoint_status_choices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pointsledger',
+            name='rolled_up',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_rolled_up, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pointsledger',
+            index=models.Index(fields=['rolled_up', 'id'], name='main_ledger_rollup_idx'),
+        ),
+    ]
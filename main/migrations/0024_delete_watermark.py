@@ -0,0 +1,16 @@
+# Generated by Django 4.2.14 on 2026-10-18 20:45
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0023_pointsledger_rolled_up'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='Watermark',
+        ),
+    ]
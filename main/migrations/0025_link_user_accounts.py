@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def link_accounts(apps, schema_editor):
+    # Rattrapage des dons et inscriptions MBC faits avant la création du
+    # compte de même email (adresses partagées par plusieurs comptes ignorées)
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    BadgeCheck = apps.get_model('main', 'BadgeCheck')
+    for model_name, email_field in [('Donation', 'donor_email'), ('MBCParticipant', 'participant_email')]:
+        model = apps.get_model('main', model_name)
+        emails = model.objects.filter(user__isnull=True).exclude(**{email_field: ''}).values(email_field)
+        accounts = (
+            User.objects.filter(email__in=emails).order_by()
+            .values('email').annotate(accounts=Count('id'), user_id=Min('id')).filter(accounts=1)
+        )
+        for account in accounts.iterator():
+            linked = model.objects.filter(user__isnull=True, **{email_field: account['email']}).update(
+                user_id=account['user_id']
+            )
+            if linked and model_name == 'Donation':
+                # Badges des dons complétés désormais rattachés
+                BadgeCheck.objects.create(user_id=account['user_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0024_delete_watermark'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_accounts, migrations.RunPython.noop),
+    ]
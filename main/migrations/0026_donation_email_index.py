@@ -0,0 +1,17 @@
+# Generated by Django 4.2.14 on 2026-10-18 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0025_link_user_accounts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='donation',
+            index=models.Index(fields=['donor_email'], name='main_donation_email_idx'),
+        ),
+    ]
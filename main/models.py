@@ -1,10 +1,110 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 import json
+from .geo import encode_geohash
 
-class UserProfile(models.Model):
+
+class TrackedFieldsMixin:
+    """
+    Mémorise les valeurs lues en base de tous les champs concrets :
+    - les signaux comparent l'état avant/après sauvegarde des champs listés
+      dans `tracked_fields` (`tracked_previous`, `tracked_changed`) ;
+    - `save_dirty` n'écrit que les champs réellement modifiés.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._reset_loaded_values()
+        return instance
+
+    def _reset_loaded_values(self, fields=None):
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or fields is None:
+            loaded = self._loaded_values = {}
+        for field in self._meta.concrete_fields:
+            if field.attname in self.__dict__ and (fields is None or field.name in fields or field.attname in fields):
+                loaded[field.attname] = self.__dict__[field.attname]
+
+    def tracked_values(self):
+        """Valeurs actuelles (en mémoire) des champs suivis"""
+        return {name: getattr(self, name) for name in self.tracked_fields}
+
+    def tracked_previous(self):
+        """Valeurs connues en base avant la sauvegarde en cours (None pour un nouvel objet)"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        current = self.tracked_values()
+        current.update((name, loaded[name]) for name in self.tracked_fields if name in loaded)
+        return current
+
+    def tracked_changed(self, *fields):
+        """Vrai si l'objet est nouveau ou si l'un des champs suivis (tous par défaut) a changé"""
+        previous = self.tracked_previous()
+        if previous is None:
+            return True
+        current = self.tracked_values()
+        return any(previous[name] != current[name] for name in fields or self.tracked_fields)
+
+    def get_dirty_fields(self):
+        """Noms des champs modifiés depuis la lecture (None pour un nouvel objet)"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or self._state.adding:
+            return None
+        return [
+            field.name for field in self._meta.concrete_fields
+            if field.attname in loaded and getattr(self, field.attname) != loaded[field.attname]
+        ]
+
+    def mark_clean(self, *fields):
+        """Considérer les champs comme écrits en base (mis à jour hors de save())"""
+        if getattr(self, '_loaded_values', None) is not None:
+            self._reset_loaded_values(fields)
+
+    def save_dirty(self):
+        """Sauvegarder uniquement les champs modifiés ; retourne False si rien n'a été écrit"""
+        dirty = self.get_dirty_fields()
+        if dirty is None:
+            self.save()
+            return True
+        if not dirty:
+            return False
+        self.save(update_fields=dirty)
+        return True
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Seuls les champs écrits sont désormais connus en base
+        update_fields = kwargs.get('update_fields')
+        self._reset_loaded_values(None if update_fields is None else set(update_fields))
+
+
+class GeohashMixin:
+    """
+    Tient à jour la colonne indexée `geohash` à partir de latitude/longitude,
+    pour les requêtes par plage de préfixes (emprises, tuiles) et les
+    comptages de zones distinctes.
+    """
+
+    def update_geohash(self):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+
+    def save(self, *args, **kwargs):
+        self.update_geohash()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+
+
+class UserProfile(GeohashMixin, TrackedFieldsMixin, models.Model):
     """Profil utilisateur étendu"""
     ROLE_CHOICES = [
         ('member', 'Membre'),
@@ -28,11 +128,15 @@ class UserProfile(models.Model):
     # Coordonnées pour la carte
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
     
     # Gamification
-    points = models.IntegerField(default=0)
+    points = models.IntegerField(default=0, db_index=True)
     level = models.IntegerField(default=1)
-    badges = models.TextField(default='[]')  # JSON des badges obtenus
+    badges = models.TextField(default='[]')  # Ancien stockage JSON des badges (voir UserBadge, commande migrate_badges)
+    
+    # Notifications non lues, tenu à jour par main.notifications (UPDATE atomiques)
+    unread_notifications = models.IntegerField(default=0, editable=False)
     
     # Préférences utilisateur
     newsletter_subscription = models.BooleanField(default=True)
@@ -45,39 +149,186 @@ class UserProfile(models.Model):
     events_participated = models.IntegerField(default=0)
     challenges_completed = models.IntegerField(default=0)
     
+    tracked_fields = ('role', 'geohash')
+    # Compteurs modifiés par UPDATE atomique : une sauvegarde complète ne les
+    # réécrit que s'ils ont été modifiés sur l'instance (ex. : admin), pour ne
+    # pas écraser un ajout concurrent avec une valeur lue plus tôt
+    ATOMIC_COUNTERS = ('unread_notifications', 'points', 'level')
+    
     def __str__(self):
         return f"{self.user.get_full_name()} - {self.get_role_display()}"
     
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            dirty = self.get_dirty_fields() or []
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and (field.name not in self.ATOMIC_COUNTERS or field.name in dirty)
+            ]
+        super().save(*args, **kwargs)
+    
     def add_badge(self, badge_name):
-        """Ajouter un badge au profil"""
-        badges_list = json.loads(self.badges) if self.badges else []
-        if badge_name not in badges_list:
-            badges_list.append(badge_name)
-            self.badges = json.dumps(badges_list)
-            self.save()
+        """Ajouter un badge au profil (sans effet s'il est déjà obtenu)"""
+        from .dashboard_cache import invalidate_dashboards
+        UserBadge.objects.bulk_create([UserBadge(user_id=self.user_id, badge=badge_name)], ignore_conflicts=True)
+        invalidate_dashboards([self.user_id])
+        # Les badges éventuellement déjà lus (prefetch) ne sont plus à jour
+        if self._meta.get_field('user').is_cached(self):
+            getattr(self.user, '_prefetched_objects_cache', {}).pop('user_badges', None)
     
     def get_badges_list(self):
-        """Récupérer la liste des badges"""
-        return json.loads(self.badges) if self.badges else []
+        """
+        Récupérer la liste des badges. Utilise le cache de
+        prefetch_related('user__user_badges') lorsqu'il est présent.
+        """
+        badges = [user_badge.badge for user_badge in self.user.user_badges.all()]
+        if self.badges and self.badges != '[]':
+            # Profil pas encore migré par `migrate_badges`
+            try:
+                legacy = json.loads(self.badges)
+            except ValueError:
+                legacy = []
+            if not isinstance(legacy, list):
+                legacy = []
+            for badge in legacy:
+                if badge not in badges:
+                    badges.append(badge)
+        return badges
+    
+    # Seuils de points (exclus) des niveaux 1 à 4 ; au-delà : niveau 5
+    LEVEL_THRESHOLDS = [(100, 1), (500, 2), (1000, 3), (2500, 4)]
+    MAX_LEVEL = 5
     
     def calculate_level(self):
         """Calculer le niveau basé sur les points"""
-        if self.points < 100:
-            return 1
-        elif self.points < 500:
-            return 2
-        elif self.points < 1000:
-            return 3
-        elif self.points < 2500:
-            return 4
-        else:
-            return 5
-    
-    def add_points(self, points):
-        """Ajouter des points et mettre à jour le niveau"""
-        self.points += points
-        self.level = self.calculate_level()
-        self.save()
+        for threshold, level in self.LEVEL_THRESHOLDS:
+            if self.points < threshold:
+                return level
+        return self.MAX_LEVEL
+    
+    @classmethod
+    def _points_update(cls, points):
+        """
+        Valeurs d'un UPDATE ajoutant `points` : le niveau est calculé en SQL
+        à partir des points avant ajout (seuils décalés de `points`). Il est
+        placé en premier car MySQL évalue les affectations dans l'ordre.
+        """
+        level = models.Case(
+            *[models.When(points__lt=threshold - points, then=models.Value(level))
+              for threshold, level in cls.LEVEL_THRESHOLDS],
+            default=models.Value(cls.MAX_LEVEL),
+        )
+        return {'level': level, 'points': models.F('points') + points}
+    
+    def add_points(self, points, reason=''):
+        """Ajouter des points et mettre à jour le niveau (UPDATE atomique, sans relecture-écriture)"""
+        from .leaderboard import record_points_change
+        with transaction.atomic():
+            UserProfile.objects.filter(pk=self.pk).update(**self._points_update(points))
+            PointsLedger.objects.create(user_id=self.user_id, points=points, reason=reason)
+            self.points, self.level = UserProfile.objects.values_list('points', 'level').get(pk=self.pk)
+            self.mark_clean('points', 'level')
+            record_points_change(self, self.points - points)
+    
+    @classmethod
+    def award_points(cls, user_ids, points, reason=''):
+        """
+        Ajouter `points` aux profils des utilisateurs `user_ids` (pointage d'un
+        événement) : points et niveaux en un seul UPDATE, journal en un INSERT
+        groupé, puis rang de chaque profil ajusté (record_points_change, une
+        série de requêtes par profil). Retourne le nombre de profils modifiés.
+        """
+        from .leaderboard import record_points_change
+        user_ids = list(user_ids)
+        with transaction.atomic():
+            updated = cls.objects.filter(user_id__in=user_ids).update(**cls._points_update(points))
+            PointsLedger.objects.bulk_create([
+                PointsLedger(user_id=user_id, points=points, reason=reason)
+                for user_id in cls.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True)
+            ], batch_size=1000)
+            for profile in cls.objects.filter(user_id__in=user_ids).only('id', 'points'):
+                record_points_change(profile, profile.points - points)
+        return updated
+
+class PointsLedger(models.Model):
+    """
+    Journal des points gagnés (une ligne par attribution), agrégé par
+    période dans PointsPeriodTotal par la commande `rollup_points`.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='points_ledger')
+    points = models.IntegerField()
+    reason = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    rolled_up = models.BooleanField(default=False)  # Déjà compté dans PointsPeriodTotal
+
+    class Meta:
+        indexes = [
+            # Lignes restant à agréger (rollup_points)
+            models.Index(fields=['rolled_up', 'id'], name='main_ledger_rollup_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} +{self.points} ({self.reason})"
+
+class PointsPeriodTotal(models.Model):
+    """Total des points d'un utilisateur sur une semaine ou un mois (classements périodiques)"""
+    PERIOD_CHOICES = [
+        ('week', 'Semaine'),
+        ('month', 'Mois'),
+    ]
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField()  # Lundi de la semaine ou 1er du mois
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='points_period_totals')
+    points = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['period', 'period_start', 'user']
+        indexes = [
+            # Top N d'une période
+            models.Index(fields=['period', 'period_start', '-points'], name='main_points_period_top_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.period} {self.period_start}: {self.points}"
+
+class UserBadge(models.Model):
+    """Badge obtenu par un utilisateur (une ligne par badge)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_badges')
+    badge = models.CharField(max_length=50, db_index=True)
+    awarded_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['user', 'badge']
+        ordering = ['awarded_at', 'id']
+
+    def __str__(self):
+        return f"{self.user.username} - {self.badge}"
+
+class BadgeCheck(models.Model):
+    """
+    Utilisateur dont les badges sont à réévaluer (don complété, activité
+    enregistrée). Écrite par post_save dans la transaction de la source
+    lorsque celle-ci est enregistrée dans `transaction.atomic()`, vidée par
+    la commande `award_badges`.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Badges à réévaluer : utilisateur {self.user_id}"
+
+class LeaderboardRank(models.Model):
+    """
+    Rang pré-calculé d'un profil dans le classement par points (classement
+    « 1224 » : les ex aequo partagent le même rang). Tenu à jour par
+    `add_points` et reconstruit par la commande `refresh_leaderboard`.
+    """
+    profile = models.OneToOneField(UserProfile, on_delete=models.CASCADE, primary_key=True, related_name='leaderboard_rank')
+    points = models.IntegerField(db_index=True)
+    rank = models.PositiveIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"#{self.rank} - profil {self.profile_id} ({self.points} points)"
 
 class Category(models.Model):
     """Catégories pour les projets et causes"""
@@ -93,7 +344,7 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
-class Project(models.Model):
+class Project(TrackedFieldsMixin, models.Model):
     """Projets principaux d'AIME"""
     PROJECT_STATUS = [
         ('planning', 'En planification'),
@@ -121,6 +372,8 @@ class Project(models.Model):
     beneficiaries_count = models.IntegerField(default=0)
     volunteers_count = models.IntegerField(default=0)
     
+    tracked_fields = ('status',)
+    
     def __str__(self):
         return self.name
     
@@ -153,7 +406,7 @@ class MutotoBikeChallenge(models.Model):
     def is_full(self):
         return self.participants_count >= self.max_participants
 
-class MBCParticipant(models.Model):
+class MBCParticipant(TrackedFieldsMixin, models.Model):
     """Participants au Mutoto Bike Challenge"""
     STATUS_CHOICES = [
         ('pending', 'En attente'),
@@ -164,6 +417,9 @@ class MBCParticipant(models.Model):
     event = models.ForeignKey(MutotoBikeChallenge, on_delete=models.CASCADE)
     participant_name = models.CharField(max_length=100)
     participant_email = models.EmailField()
+    # Compte de l'inscrit : renseigné à l'inscription, ou par rapprochement
+    # de l'email (commande `link_user_accounts`)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='mbc_participations')
     participant_phone = models.CharField(max_length=20)
     age = models.IntegerField()
     parent_name = models.CharField(max_length=100, blank=True)
@@ -173,6 +429,8 @@ class MBCParticipant(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     registered_at = models.DateTimeField(auto_now_add=True)
     
+    tracked_fields = ('status',)
+    
     def __str__(self):
         return f"{self.participant_name} - {self.event.name}"
 
@@ -191,7 +449,7 @@ class MutoScienceAdventure(models.Model):
     def __str__(self):
         return self.name
 
-class Event(models.Model):
+class Event(TrackedFieldsMixin, models.Model):
     """Événements et activités"""
     EVENT_TYPES = [
         ('workshop', 'Atelier'),
@@ -217,10 +475,12 @@ class Event(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    tracked_fields = ('event_type', 'is_active')
+    
     def __str__(self):
         return self.title
 
-class Donation(models.Model):
+class Donation(TrackedFieldsMixin, models.Model):
     """Dons et contributions"""
     DONATION_STATUS = [
         ('pending', 'En attente'),
@@ -231,6 +491,9 @@ class Donation(models.Model):
     
     donor_name = models.CharField(max_length=100)
     donor_email = models.EmailField()
+    # Compte du donateur : renseigné à la création, ou par rapprochement de
+    # l'email (commande `link_user_accounts`)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='donations')
     donor_phone = models.CharField(max_length=20, blank=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     currency = models.CharField(max_length=3, default='CDF')
@@ -241,6 +504,16 @@ class Donation(models.Model):
     transaction_id = models.CharField(max_length=100, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    tracked_fields = ('donor_email', 'amount', 'status', 'donor_name', 'message', 'user_id')
+    
+    class Meta:
+        indexes = [
+            # Historique des dons d'un compte paginé par clé (created_at, id)
+            models.Index(fields=['user', '-created_at', '-id'], name='main_donation_user_page_idx'),
+            # Donateurs distincts (EXISTS par email) et rattachement aux comptes
+            models.Index(fields=['donor_email'], name='main_donation_email_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.donor_name} - {self.amount} {self.currency}"
 
@@ -297,11 +570,15 @@ class UserActivity(models.Model):
     class Meta:
         verbose_name_plural = "User Activities"
         ordering = ['-timestamp']
+        indexes = [
+            # Historique paginé par clé (timestamp, id) d'un utilisateur
+            models.Index(fields=['user', '-timestamp', '-id'], name='main_activity_user_page_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.get_activity_type_display()}"
 
-class UserNotification(models.Model):
+class UserNotification(TrackedFieldsMixin, models.Model):
     """Notifications utilisateur"""
     NOTIFICATION_TYPES = [
         ('info', 'Information'),
@@ -322,13 +599,65 @@ class UserNotification(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     link_url = models.URLField(blank=True, null=True)
     
+    tracked_fields = ('is_read',)
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Centre de notifications paginé par clé (created_at, id)
+            models.Index(fields=['user', '-created_at', '-id'], name='main_notif_user_page_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.title}"
 
-class EventParticipation(models.Model):
+class NotificationBroadcast(models.Model):
+    """
+    Notification envoyée à un segment de membres. La commande
+    `send_broadcasts` crée les UserNotification par lots, en reprenant après
+    le dernier utilisateur servi (`last_user_id`).
+    """
+    STATUS_CHOICES = [
+        ('draft', 'Brouillon'),
+        ('pending', 'En attente d\'envoi'),
+        ('sending', 'En cours d\'envoi'),
+        ('sent', 'Envoyée'),
+    ]
+    
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    notification_type = models.CharField(max_length=20, choices=UserNotification.NOTIFICATION_TYPES, default='info')
+    link_url = models.URLField(blank=True, null=True)
+    
+    # Segment des destinataires (vide : tous les membres actifs)
+    role = models.CharField(max_length=20, choices=UserProfile.ROLE_CHOICES, blank=True)
+    language = models.CharField(max_length=10, choices=[('fr', 'Français'), ('en', 'English')], blank=True)
+    newsletter_only = models.BooleanField(default=False)
+    
+    # Avancement
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft', db_index=True)
+    total_recipients = models.IntegerField(default=0)
+    sent_count = models.IntegerField(default=0)
+    last_user_id = models.IntegerField(default=0)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.title} ({self.get_status_display()})"
+    
+    @property
+    def progress(self):
+        """Pourcentage de destinataires servis"""
+        if not self.total_recipients:
+            return 100 if self.status == 'sent' else 0
+        return min(100, round(self.sent_count * 100 / self.total_recipients))
+
+class EventParticipation(TrackedFieldsMixin, models.Model):
     """Participation aux événements"""
     PARTICIPATION_STATUS = [
         ('registered', 'Inscrit'),
@@ -344,6 +673,8 @@ class EventParticipation(models.Model):
     registration_date = models.DateTimeField(auto_now_add=True)
     notes = models.TextField(blank=True)
     
+    tracked_fields = ('status', 'event_id')
+    
     class Meta:
         unique_together = ['user', 'event']
     
@@ -401,7 +732,7 @@ class ChatMessage(models.Model):
         return f"{sender}: {self.content[:30]}... ({self.timestamp.strftime('%Y-%m-%d %H:%M')})"
 
 # --- Contribution Staff ---
-class StaffContribution(models.Model):
+class StaffContribution(TrackedFieldsMixin, models.Model):
     """Contribution mensuelle ou ponctuelle d'un membre du staff."""
     staff = models.ForeignKey(User, on_delete=models.CASCADE, related_name='staff_contributions')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -412,6 +743,8 @@ class StaffContribution(models.Model):
     validated_at = models.DateTimeField(null=True, blank=True)
     validated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='validated_contributions')
 
+    tracked_fields = ('amount', 'is_recorded', 'validated_at', 'validated_by_id', 'object', 'month')
+
     def __str__(self):
         return f"{self.staff.get_full_name()} - {self.amount} ({self.month})"
 
@@ -446,7 +779,7 @@ class Ticket(models.Model):
         return f"Ticket #{self.id} - {self.subject} ({self.get_status_display()})"
 
 # --- Impact Social Centralisé ---
-class ImpactPoint(models.Model):
+class ImpactPoint(GeohashMixin, TrackedFieldsMixin, models.Model):
     TYPE_CHOICES = [
         ('donation', 'Don'),
         ('event', 'Événement'),
@@ -455,16 +788,127 @@ class ImpactPoint(models.Model):
         ('project', 'Projet'),
         ('other', 'Autre'),
     ]
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('active', 'Actif'),
+        ('completed', 'Complété'),
+        ('confirmed', 'Confirmé'),
+        ('attended', 'Présent'),
+    ]
     type = models.CharField(max_length=20, choices=TYPE_CHOICES)
     related_id = models.IntegerField(null=True, blank=True)  # ID de l'objet lié (don, event, etc.)
     related_model = models.CharField(max_length=50, blank=True)  # Nom du modèle lié
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
     description = models.TextField(blank=True)
     value = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)  # Montant, score, etc.
-    status = models.CharField(max_length=30, blank=True)  # ex: 'completed', 'pending', 'active'
+    status = models.CharField(max_length=30, choices=STATUS_CHOICES, blank=True)  # Statut de la source projetée
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    tracked_fields = ('latitude', 'longitude', 'geohash', 'value')
+
+    class Meta:
+        indexes = [
+            # Flux incrémental /api/impact-data/ (curseur updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='main_impact_updated_idx'),
+        ]
+
     def __str__(self):
         return f"Impact {self.type} ({self.related_model} #{self.related_id})"
+
+class ImpactCluster(models.Model):
+    """Agrégat pré-calculé des points d'impact par cellule de grille et niveau de zoom"""
+    zoom = models.PositiveSmallIntegerField()
+    cell_x = models.IntegerField()
+    cell_y = models.IntegerField()
+    point_count = models.IntegerField(default=0)
+    value_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Sommes des coordonnées, pour placer le marqueur au barycentre
+    latitude_sum = models.FloatField(default=0)
+    longitude_sum = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ['zoom', 'cell_x', 'cell_y']
+
+    def __str__(self):
+        return f"Cluster z{self.zoom} ({self.cell_x}, {self.cell_y}) - {self.point_count} points"
+
+# --- Outbox de synchronisation des ImpactPoint ---
+class ImpactOutbox(models.Model):
+    """
+    Modification d'une source (don, participation, contribution) en attente
+    de projection sur ImpactPoint. Écrite par post_save dans la transaction
+    de la source lorsque celle-ci est enregistrée dans `transaction.atomic()`,
+    vidée par lots par la commande `drain_impact_outbox`.
+    """
+    source_model = models.CharField(max_length=50)
+    source_id = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)  # Prochaine tentative
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at', 'id'], name='main_outbox_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"Outbox {self.source_model} #{self.source_id} ({self.attempts} tentatives)"
+
+# --- Statistiques du site (instantané matérialisé) ---
+class SiteStatistics(models.Model):
+    """
+    Instantané des compteurs de la page d'accueil (une seule ligne).
+    Maintenu par deltas atomiques dans main/signals.py et reconstruit
+    par la commande `rebuild_site_statistics`.
+    """
+    SINGLETON_ID = 1
+    COUNTER_FIELDS = [
+        'total_donations', 'children_profiles', 'mbc_participants', 'active_projects',
+        'total_events', 'formations_dispensed', 'families_supported', 'user_locations',
+        'impact_locations', 'staff_contributions', 'event_participations', 'total_users',
+        'total_volunteers', 'total_donors', 'total_profiles', 'all_events',
+    ]
+
+    total_donations = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    children_profiles = models.IntegerField(default=0)
+    mbc_participants = models.IntegerField(default=0)
+    active_projects = models.IntegerField(default=0)
+    total_events = models.IntegerField(default=0)
+    formations_dispensed = models.IntegerField(default=0)
+    families_supported = models.IntegerField(default=0)
+    user_locations = models.IntegerField(default=0)
+    impact_locations = models.IntegerField(default=0)
+    staff_contributions = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    event_participations = models.IntegerField(default=0)
+    total_users = models.IntegerField(default=0)
+    total_volunteers = models.IntegerField(default=0)
+    total_donors = models.IntegerField(default=0)
+    total_profiles = models.IntegerField(default=0)
+    all_events = models.IntegerField(default=0)  # Actifs ou non (en-tête de la carte)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Site Statistics"
+
+    def __str__(self):
+        return f"Statistiques du site ({self.updated_at:%Y-%m-%d %H:%M})"
+
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """Appliquer des deltas atomiques (F()) aux compteurs de l'instantané"""
+        changes = {name: models.F(name) + delta for name, delta in deltas.items() if delta}
+        if changes:
+            cls.objects.filter(pk=cls.SINGLETON_ID).update(updated_at=timezone.now(), **changes)
+
+    @classmethod
+    def set_counters(cls, values):
+        """Remplacer la valeur de certains compteurs (recomptage ponctuel)"""
+        if values:
+            cls.objects.filter(pk=cls.SINGLETON_ID).update(updated_at=timezone.now(), **values)
+
+    def counters(self):
+        return {name: getattr(self, name) for name in self.COUNTER_FIELDS}
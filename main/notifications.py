@@ -0,0 +1,75 @@
+"""
+Compteur de notifications non lues (UserProfile.unread_notifications).
+
+Le compteur est modifié par UPDATE atomique à la création, à la lecture et à
+la suppression d'une notification. Sa valeur est servie depuis le cache au
+badge de la barre de navigation (processeur de contexte), sans requête.
+
+La valeur est stockée avec la version de l'utilisateur pour laquelle elle a
+été lue (comme l'instantané du tableau de bord) ; une écriture supprime la
+version au commit. Une lecture commencée avant le commit stocke l'ancienne
+version, qui ne correspond plus : la valeur est relue au prochain affichage.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .caching import current_version
+from .models import UserNotification, UserProfile
+
+
+def get_unread_count(user):
+    """Nombre de notifications non lues de `user` (depuis le cache si possible)"""
+    version_key, count_key = _version_key(user.pk), _cache_key(user.pk)
+    cached = cache.get_many([version_key, count_key])
+    version, stored = cached.get(version_key), cached.get(count_key)
+    if version is not None and stored is not None and stored[0] == version:
+        return stored[1]
+    if version is None:
+        version = current_version(version_key)
+    count = _load_count(user.pk)
+    cache.set(count_key, (version, count), timeout=getattr(settings, 'UNREAD_NOTIFICATIONS_CACHE_TTL', 300))
+    return count
+
+
+def adjust_unread_count(user_ids, delta):
+    """Ajouter `delta` au compteur des utilisateurs `user_ids` (jamais en dessous de zéro)"""
+    user_ids = set(user_ids)
+    if not user_ids or not delta:
+        return
+    UserProfile.objects.filter(user_id__in=user_ids).update(
+        unread_notifications=Greatest(F('unread_notifications') + delta, 0)
+    )
+    keys = [_version_key(user_id) for user_id in user_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def mark_read(user, notification_id):
+    """Marquer une notification comme lue ; retourne False si elle l'était déjà"""
+    with transaction.atomic():
+        # UPDATE conditionnel : deux lectures simultanées ne décrémentent qu'une fois
+        updated = UserNotification.objects.filter(id=notification_id, user=user, is_read=False).update(is_read=True)
+        adjust_unread_count([user.pk], -updated)
+    return bool(updated)
+
+
+def mark_all_read(user):
+    """Marquer toutes les notifications de `user` comme lues ; retourne leur nombre"""
+    with transaction.atomic():
+        updated = UserNotification.objects.filter(user=user, is_read=False).update(is_read=True)
+        adjust_unread_count([user.pk], -updated)
+    return updated
+
+
+def _load_count(user_id):
+    return UserProfile.objects.filter(user_id=user_id).values_list('unread_notifications', flat=True).first() or 0
+
+
+def _cache_key(user_id):
+    return f'notifications:{user_id}:unread'
+
+
+def _version_key(user_id):
+    return f'notifications:{user_id}:version'
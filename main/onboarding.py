@@ -0,0 +1,73 @@
+"""
+Inscription d'un utilisateur : profil (avec points de bienvenue et leur
+ligne au journal des points), badge, activité et notification écrits dans
+une seule transaction, en une insertion par table. Les dons et inscriptions
+MBC faits avec son email avant l'inscription sont rattachés au compte.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Exists
+
+from .badge_rules import queue_checks
+from .models import Donation, MBCParticipant, PointsLedger, UserActivity, UserBadge, UserNotification, UserProfile
+
+WELCOME_POINTS = 50
+WELCOME_BADGE = 'new_member'
+
+# Modèles rattachés à un compte, avec le champ email servant au rapprochement
+LINKED_MODELS = [
+    (Donation, 'donor_email'),
+    (MBCParticipant, 'participant_email'),
+]
+
+
+def onboard_user(user, role='member'):
+    """Créer le profil, le badge, l'activité d'inscription et la notification de bienvenue de `user`"""
+    # savepoint=False : pas de SAVEPOINT supplémentaire quand l'inscription
+    # est déjà dans une transaction (création de l'utilisateur)
+    with transaction.atomic(savepoint=False):
+        profile = UserProfile.objects.create(
+            user=user,
+            role=role,
+            points=WELCOME_POINTS,  # Points de bienvenue
+            level=1,
+            unread_notifications=1,  # Notification de bienvenue
+        )
+        # Comptés dans les classements de la semaine et du mois
+        PointsLedger.objects.create(user=user, points=WELCOME_POINTS, reason='welcome')
+        UserBadge.objects.create(user=user, badge=WELCOME_BADGE)
+        UserActivity.objects.create(
+            user=user,
+            activity_type='registration',
+            description='Inscription sur la plateforme AIME'
+        )
+        # bulk_create : déjà comptée dans le profil, sans UPDATE du compteur par post_save
+        UserNotification.objects.bulk_create([UserNotification(
+            user=user,
+            title='Bienvenue chez AIME !',
+            message=f'Bonjour {user.first_name or user.username}, merci de rejoindre notre communauté. Découvrez votre tableau de bord et nos projets.',
+            notification_type='success'
+        )])
+        link_existing_rows(user)
+    # Évite une requête au prochain accès à user.userprofile
+    user.userprofile = profile
+    return profile
+
+
+def link_existing_rows(user):
+    """
+    Rattacher à `user` les dons et inscriptions MBC sans compte faits avec
+    son email (un UPDATE par modèle). Une adresse partagée par plusieurs
+    comptes n'est rattachée à aucun.
+    """
+    if not user.email:
+        return
+    shared = Exists(User.objects.filter(email=user.email).exclude(pk=user.pk))
+    for model, email_field in LINKED_MODELS:
+        linked = model.objects.filter(
+            ~shared,
+            user__isnull=True,
+            **{email_field: user.email},
+        ).update(user=user)
+        if linked and model is Donation:
+            queue_checks([user.pk])
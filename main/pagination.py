@@ -0,0 +1,103 @@
+"""
+Pagination par clé (« keyset ») pour les listes longues du tableau de bord.
+
+Une page est lue à partir d'un curseur (date et id de la dernière ligne
+affichée) : `WHERE (date, id) < (curseur) ORDER BY date DESC, id DESC LIMIT n`,
+servi par un index composite (utilisateur, date, id). Le coût ne dépend pas de
+la profondeur atteinte et aucun COUNT(*) n'est nécessaire ; le total, lorsqu'il
+est affiché, est un comptage borné (`approximate_count`).
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# Au-delà, le total est affiché sous la forme « 1000+ »
+APPROXIMATE_COUNT_LIMIT = 1000
+
+
+class InvalidCursor(ValueError):
+    """Curseur illisible ou ne correspondant pas au tri de la liste"""
+
+
+class KeysetPage:
+    """Une page : les lignes, et le curseur de la suivante s'il y en a une"""
+
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+class KeysetPaginator:
+    """
+    Découpe `queryset` en pages de `per_page` lignes, du plus récent au plus
+    ancien selon `field` (départagé par l'id).
+    """
+
+    def __init__(self, queryset, per_page, field='created_at'):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = field
+        self._model_field = queryset.model._meta.get_field(field)
+
+    def page(self, cursor=None):
+        """Page suivant `cursor` (première page si absent) ; lève InvalidCursor"""
+        queryset = self.queryset.order_by(f'-{self.field}', '-id')
+        if cursor:
+            value, last_id = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__lt': value}) | Q(**{self.field: value, 'id__lt': last_id})
+            )
+        # Une ligne de plus que la page : indique s'il existe une suite
+        items = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(items) > self.per_page:
+            items = items[:self.per_page]
+            next_cursor = self.encode_cursor(items[-1])
+        return KeysetPage(items, next_cursor)
+
+    def get_page(self, cursor=None):
+        """Comme `page`, mais revient à la première page si le curseur est invalide"""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+    def approximate_count(self, limit=APPROXIMATE_COUNT_LIMIT):
+        """
+        Nombre de lignes, compté au plus jusqu'à `limit` (sous-requête
+        limitée). Retourne (nombre, exact) ; `exact` est faux au-delà de `limit`.
+        """
+        count = self.queryset.order_by()[:limit + 1].count()
+        return min(count, limit), count <= limit
+
+    def encode_cursor(self, item):
+        value = getattr(item, self.field)
+        raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value, item.pk])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            value, last_id = json.loads(raw)
+            value = self._model_field.to_python(value)
+            last_id = int(last_id)
+        except (TypeError, ValueError, ValidationError) as error:
+            raise InvalidCursor(str(error)) from error
+        if value is None:
+            raise InvalidCursor('valeur vide')
+        return value, last_id
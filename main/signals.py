@@ -1,112 +1,199 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile, UserActivity, UserNotification, StaffContribution, Donation, EventParticipation, ImpactPoint
-# --- ImpactPoint sync: DONATION ---
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-
+from .models import (
+    UserProfile, UserActivity, UserBadge, UserNotification, StaffContribution, Donation, EventParticipation,
+    ImpactPoint, SiteStatistics, MBCParticipant, Event, MutotoBikeChallenge
+)
+from .utils import STATISTICS_RULES, DISTINCT_STATISTICS, count_statistic, distinct_value_delta
+from .impact_map import record_point_changes, record_point_deletion
+from . import badge_rules, dashboard_cache, impact_projection, leaderboard, notifications
+from .onboarding import onboard_user
+# --- ImpactPoint sync : inscription dans l'outbox (projetée par drain_impact_outbox) ---
+# Uniquement lorsqu'un champ projeté change : les ré-enregistrements sans effet
+# (admin, sauvegardes en masse) n'écrivent rien.
 @receiver(post_save, sender=Donation)
-def sync_impact_donation(sender, instance, created, **kwargs):
-    if instance.status == 'completed':
-        ImpactPoint.objects.update_or_create(
-            type='donation',
-            related_id=instance.id,
-            related_model='Donation',
-            defaults={
-                'latitude': None,
-                'longitude': None,
-                'description': instance.message or f"Don de {instance.donor_name}",
-                'value': instance.amount,
-                'status': instance.status,
-            }
-        )
+def sync_impact_donation(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        impact_projection.enqueue_if_changed(instance)
 
-# --- ImpactPoint sync: EVENT PARTICIPATION ---
 @receiver(post_save, sender=EventParticipation)
-def sync_impact_event_participation(sender, instance, created, **kwargs):
-    if instance.status in ['confirmed', 'attended']:
-        ImpactPoint.objects.update_or_create(
-            type='participation',
-            related_id=instance.id,
-            related_model='EventParticipation',
-            defaults={
-                'latitude': None,
-                'longitude': None,
-                'description': f"Participation à {instance.event.title}",
-                'value': None,
-                'status': instance.status,
-            }
-        )
+def sync_impact_event_participation(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        impact_projection.enqueue_if_changed(instance)
 
-# --- ImpactPoint sync: STAFF CONTRIBUTION ---
 @receiver(post_save, sender=StaffContribution)
-def sync_impact_staff_contribution(sender, instance, created, **kwargs):
-    if instance.is_recorded and instance.validated_at:
-        ImpactPoint.objects.update_or_create(
-            type='contribution',
-            related_id=instance.id,
-            related_model='StaffContribution',
-            defaults={
-                'latitude': None,
-                'longitude': None,
-                'description': instance.object or f"Contribution staff {instance.month}",
-                'value': instance.amount,
-                'status': 'completed',
-            }
-        )
+def sync_impact_staff_contribution(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        impact_projection.enqueue_if_changed(instance)
+
+@receiver(post_delete, sender=Donation)
+@receiver(post_delete, sender=EventParticipation)
+@receiver(post_delete, sender=StaffContribution)
+def sync_impact_source_delete(sender, instance, **kwargs):
+    # Le drain supprimera le point dont la source n'existe plus
+    impact_projection.enqueue(instance)
+
+# --- Badges : réévaluation par la commande award_badges ---
+# File écrite dans la transaction de l'appelant : les vues enregistrent les
+# dons et les activités dans transaction.atomic()
+@receiver(post_save, sender=Donation)
+def check_donation_badges(sender, instance, created, raw=False, **kwargs):
+    # Don complété (à la création ou plus tard) ou rattaché à un compte
+    if not raw and instance.user_id and instance.status == 'completed' and instance.tracked_changed('status', 'user_id'):
+        badge_rules.queue_checks([instance.user_id])
+
+@receiver(post_save, sender=UserActivity)
+def check_activity_badges(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.activity_type in badge_rules.ACTIVITY_TYPES:
+        badge_rules.queue_checks([instance.user_id])
+
+def _is_validated(state):
+    return bool(state and state['is_recorded'] and state['validated_at'])
+
 # --- Notification automatique lors de la validation d'une contribution staff ---
 @receiver(post_save, sender=StaffContribution)
-def notify_staff_contribution(sender, instance, created, **kwargs):
-    # On ne notifie que si la contribution vient d'être validée (is_recorded=True et validated_at non nul)
-    if instance.is_recorded and instance.validated_at:
-        # Notification pour le contributeur
+def notify_staff_contribution(sender, instance, created, raw=False, **kwargs):
+    # On ne notifie qu'au moment de la validation (passage à is_recorded=True avec validated_at),
+    # pas à chaque sauvegarde d'une contribution déjà validée
+    if raw or not _is_validated(instance.tracked_values()) or _is_validated(instance.tracked_previous()):
+        return
+    # Notification pour le contributeur
+    UserNotification.objects.get_or_create(
+        user=instance.staff,
+        title=f"Contribution enregistrée pour {instance.month}",
+        message=f"Votre contribution de {instance.amount} CDF pour '{instance.object or 'cotisation'}' a été enregistrée. Merci !",
+        notification_type='success',
+    )
+    # Notification pour le responsable caisse (si différent)
+    if instance.validated_by and instance.validated_by != instance.staff:
         UserNotification.objects.get_or_create(
-            user=instance.staff,
-            title=f"Contribution enregistrée pour {instance.month}",
-            message=f"Votre contribution de {instance.amount} CDF pour '{instance.object or 'cotisation'}' a été enregistrée. Merci !",
-            notification_type='success',
+            user=instance.validated_by,
+            title=f"Contribution staff validée",
+            message=f"Vous avez validé la contribution de {instance.staff.get_full_name()} ({instance.amount} CDF, {instance.month}).",
+            notification_type='info',
         )
-        # Notification pour le responsable caisse (si différent)
-        if instance.validated_by and instance.validated_by != instance.staff:
-            UserNotification.objects.get_or_create(
-                user=instance.validated_by,
-                title=f"Contribution staff validée",
-                message=f"Vous avez validé la contribution de {instance.staff.get_full_name()} ({instance.amount} CDF, {instance.month}).",
-                notification_type='info',
-            )
 
 @receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
     """Créer automatiquement un profil utilisateur lors de l'inscription"""
-    if created:
-        profile = UserProfile.objects.create(
-            user=instance,
-            role='member',
-            points=50,  # Points de bienvenue
-            level=1,
-        )
-        
-        # Ajouter badge de bienvenue
-        profile.add_badge('new_member')
-        
-        # Enregistrer l'activité
-        UserActivity.objects.create(
-            user=instance,
-            activity_type='registration',
-            description='Inscription sur la plateforme AIME'
-        )
-        
-        # Notification de bienvenue
-        UserNotification.objects.create(
-            user=instance,
-            title='Bienvenue chez AIME !',
-            message=f'Bonjour {instance.first_name or instance.username}, merci de rejoindre notre communauté. Découvrez votre tableau de bord et nos projets.',
-            notification_type='success'
+    if created and not raw:
+        onboard_user(instance)
+
+@receiver(pre_delete, sender=UserProfile)
+def remove_leaderboard_rank(sender, instance, **kwargs):
+    """Décaler les rangs des profils moins bien classés que le profil supprimé"""
+    leaderboard.record_profile_removal(instance.pk)
+
+@receiver(post_save, sender=User)
+def save_user_profile(sender, instance, created, **kwargs):
+    """Sauvegarder le profil utilisateur s'il a été chargé et modifié"""
+    # À la création, le profil vient d'être écrit par onboard_user. Un profil
+    # jamais chargé (connexion : mise à jour de last_login) n'a rien à écrire.
+    if not created and User.userprofile.related.is_cached(instance):
+        instance.userprofile.save_dirty()
+
+# --- Instantané SiteStatistics : deltas atomiques ---
+def _field_value(state, name):
+    # Une ligne absente (création, suppression) compte comme un champ vide
+    return (state[name] if state else None) or None
+
+def _update_site_statistics(instance, before, after):
+    """Appliquer à l'instantané la différence de contribution d'une ligne"""
+    deltas = {}
+    rule = STATISTICS_RULES.get(type(instance))
+    if rule:
+        deltas = rule(after) if after is not None else {}
+        for name, value in (rule(before) if before is not None else {}).items():
+            deltas[name] = deltas.get(name, 0) - value
+    for name, field in DISTINCT_STATISTICS.get(type(instance), {}).items():
+        deltas[name] = distinct_value_delta(
+            instance, field, _field_value(before, field), _field_value(after, field)
         )
+    SiteStatistics.apply_deltas(deltas)
+
+def _sync_site_statistics_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    _update_site_statistics(instance, instance.tracked_previous(), instance.tracked_values())
+
+def _sync_site_statistics_on_delete(sender, instance, **kwargs):
+    _update_site_statistics(instance, instance.tracked_previous() or instance.tracked_values(), None)
+
+for _model in set(STATISTICS_RULES) | set(DISTINCT_STATISTICS):
+    post_save.connect(_sync_site_statistics_on_save, sender=_model, dispatch_uid=f'site_statistics_save_{_model.__name__}')
+    post_delete.connect(_sync_site_statistics_on_delete, sender=_model, dispatch_uid=f'site_statistics_delete_{_model.__name__}')
+
+@receiver(post_init, sender=User)
+def remember_user_is_active(sender, instance, **kwargs):
+    # Valeur chargée (absente si le champ est différé) : comparée à la sauvegarde
+    instance._loaded_is_active = instance.__dict__.get('is_active')
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """Sauvegarder le profil utilisateur"""
-    if hasattr(instance, 'userprofile'):
-        instance.userprofile.save()
+def sync_site_statistics_user(sender, instance, created, update_fields=None, **kwargs):
+    """Compter les utilisateurs actifs par delta, seulement si is_active a changé"""
+    if created:
+        SiteStatistics.apply_deltas({'total_users': int(instance.is_active)})
+    elif update_fields is None or 'is_active' in update_fields:
+        loaded = getattr(instance, '_loaded_is_active', None)
+        if loaded is None:
+            # Valeur chargée inconnue (champ différé) : recomptage
+            SiteStatistics.set_counters({'total_users': count_statistic('total_users')})
+        elif loaded != instance.is_active:
+            SiteStatistics.apply_deltas({'total_users': 1 if instance.is_active else -1})
+    instance._loaded_is_active = instance.is_active
+
+@receiver(post_delete, sender=User)
+def sync_site_statistics_user_delete(sender, instance, **kwargs):
+    SiteStatistics.apply_deltas({'total_users': -int(instance.is_active)})
+
+# --- Index de la carte (regroupements et cache des tuiles) ---
+@receiver(post_save, sender=ImpactPoint)
+def sync_impact_map(sender, instance, raw=False, **kwargs):
+    if not raw:
+        record_point_changes([(instance.tracked_previous(), instance.tracked_values())])
+
+@receiver(post_delete, sender=ImpactPoint)
+def sync_impact_map_delete(sender, instance, **kwargs):
+    record_point_changes([(instance.tracked_previous() or instance.tracked_values(), None)])
+    record_point_deletion()
+
+# --- Cache du tableau de bord (instantané par utilisateur, rendez-vous communs) ---
+@receiver(post_save, sender=Donation)
+@receiver(post_delete, sender=Donation)
+@receiver(post_save, sender=MBCParticipant)
+@receiver(post_delete, sender=MBCParticipant)
+@receiver(post_save, sender=EventParticipation)
+@receiver(post_delete, sender=EventParticipation)
+@receiver(post_save, sender=UserActivity)
+@receiver(post_delete, sender=UserActivity)
+@receiver(post_save, sender=UserBadge)
+@receiver(post_delete, sender=UserBadge)
+def invalidate_user_dashboard(sender, instance, **kwargs):
+    dashboard_cache.invalidate_dashboards([instance.user_id])
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=MutotoBikeChallenge)
+@receiver(post_delete, sender=MutotoBikeChallenge)
+def invalidate_dashboard_upcoming(sender, instance, **kwargs):
+    dashboard_cache.invalidate_upcoming()
+
+# --- Compteur de notifications non lues (UserProfile.unread_notifications) ---
+@receiver(post_save, sender=UserNotification)
+def count_unread_notification(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        delta = int(not instance.is_read)
+    else:
+        previous = instance.tracked_previous()
+        if previous is None:
+            return
+        delta = int(previous['is_read']) - int(instance.is_read)
+    notifications.adjust_unread_count([instance.user_id], delta)
+
+@receiver(post_delete, sender=UserNotification)
+def uncount_unread_notification(sender, instance, **kwargs):
+    if not (instance.tracked_previous() or instance.tracked_values())['is_read']:
+        notifications.adjust_unread_count([instance.user_id], -1)
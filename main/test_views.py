@@ -1,10 +1,10 @@
 from django.http import JsonResponse
-from .utils import get_site_statistics
+from .utils import get_cached_site_statistics
 
 def test_stats(request):
     """Vue de test pour vérifier les statistiques"""
     try:
-        stats = get_site_statistics()
+        stats = get_cached_site_statistics()
         return JsonResponse({
             'success': True,
             'stats': stats
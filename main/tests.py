@@ -1,3 +1,706 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.contrib.auth.models import Permission, User
+from django.utils import timezone
+
+from . import badge_rules, broadcasts, caching, impact_map, impact_projection, leaderboard, notifications
+from .models import (
+    BadgeCheck, Donation, Event, EventParticipation, ImpactOutbox, ImpactPoint, LeaderboardRank, MBCParticipant,
+    MutotoBikeChallenge, NotificationBroadcast, PointsLedger, PointsPeriodTotal, SiteStatistics, UserActivity, UserNotification, UserProfile
+)
+from .context_processors import unread_notifications
+from .notifications import get_unread_count, mark_all_read
+from .pagination import InvalidCursor, KeysetPaginator
+from .utils import compute_site_counters, rebuild_site_statistics
+
+
+class SiteStatisticsTests(TestCase):
+    """Statistiques de la page d'accueil"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('organisateur', 'orga@exemple.com', 'motdepasse')
+        profile = UserProfile.objects.get(user=self.user)
+        profile.role = 'child'
+        profile.latitude, profile.longitude = Decimal('-4.3317'), Decimal('15.3139')
+        profile.save()
+        Donation.objects.create(donor_name='A', donor_email='a@exemple.com', amount=1000, status='completed')
+        Donation.objects.create(donor_name='A', donor_email='a@exemple.com', amount=500, status='pending')
+        event = Event.objects.create(
+            title='Atelier', slug='atelier', description='Atelier vélo', event_type='workshop',
+            date=timezone.now(), location='Kinshasa', organizer=self.user
+        )
+        EventParticipation.objects.create(user=self.user, event=event, status='confirmed')
+        mbc = MutotoBikeChallenge.objects.create(
+            name='MBC', slug='mbc', description='MBC', date=timezone.now(), location='Kinshasa'
+        )
+        MBCParticipant.objects.create(
+            event=mbc, participant_name='P', participant_email='p@exemple.com', participant_phone='0',
+            age=10, emergency_contact='C', emergency_phone='0', status='confirmed'
+        )
+        ImpactPoint.objects.create(type='other', latitude=Decimal('-4.3317'), longitude=Decimal('15.3139'))
+        ImpactPoint.objects.create(type='other', latitude=Decimal('-4.3317'), longitude=Decimal('15.3139'))
+
+    def test_compute_site_counters_query_count(self):
+        with self.assertNumQueries(7):
+            counters = compute_site_counters()
+
+        self.assertEqual(counters['total_donations'], 1000)
+        self.assertEqual(counters['total_donors'], 1)
+        self.assertEqual(counters['children_profiles'], 1)
+        self.assertEqual(counters['mbc_participants'], 1)
+        self.assertEqual(counters['total_events'], 1)
+        self.assertEqual(counters['formations_dispensed'], 1)
+        self.assertEqual(counters['event_participations'], 1)
+        self.assertEqual(counters['user_locations'], 1)
+        self.assertEqual(counters['impact_locations'], 1)
+        self.assertEqual(counters['total_users'], 1)
+        self.assertEqual(counters['total_profiles'], 1)
+        self.assertEqual(counters['all_events'], 1)
+
+    def test_write_deltas_match_recount(self):
+        rebuild_site_statistics()
+        repeat = Donation.objects.create(donor_name='A', donor_email='a@exemple.com', amount=10, status='completed')
+        other = Donation.objects.create(donor_name='B', donor_email='b@exemple.com', amount=10, status='completed')
+        other.donor_email = 'c@exemple.com'
+        other.save()
+        repeat.delete()
+
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Orga'
+        # Sauvegarde complète sans changement de is_active : aucune requête sur les utilisateurs
+        with self.assertNumQueries(1):
+            user.save()
+        user.is_active = False
+        user.save()
+        User.objects.create_user('autre', 'autre@exemple.com', 'motdepasse').delete()
+
+        self.assertEqual(SiteStatistics.objects.get().counters(), compute_site_counters())
+
+
+class StaleWhileRevalidateTests(TestCase):
+    """Cache stale-while-revalidate : rafraîchissement unique, attente des absents, métriques"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stale_value_is_served_during_a_single_refresh(self):
+        caching.get_or_refresh('test', lambda: 'ancien', ttl=60)
+        started = []
+        with mock.patch.object(caching.time, 'time', return_value=caching.time.time() + 61), \
+                mock.patch.object(caching.threading, 'Thread') as thread:
+            thread.side_effect = lambda target, args, daemon: started.append((target, args)) or mock.Mock()
+            for _ in range(3):
+                self.assertEqual(caching.get_or_refresh('test', lambda: 'nouveau', ttl=60), 'ancien')
+        self.assertEqual(len(started), 1)
+
+        target, args = started[0]
+        target(*args)
+        self.assertEqual(caching.get_or_refresh('test', lambda: 'autre', ttl=60), 'nouveau')
+        metrics = caching.get_metrics(['test'])['test']
+        self.assertEqual((metrics['stale'], metrics['refreshes']), (3, 2))
+
+    def test_waiting_caller_gets_the_lock_holders_value(self):
+        # Un autre processus détient le verrou et stocke sa valeur pendant l'attente
+        cache.add(caching._lock_key('test'), True)
+        compute = mock.Mock(return_value='calculé ici')
+        holder = lambda seconds: caching.refresh('test', lambda: 'détenteur', ttl=60)
+        with mock.patch.object(caching.time, 'sleep', side_effect=holder):
+            self.assertEqual(caching.get_or_refresh('test', compute, ttl=60), 'détenteur')
+        compute.assert_not_called()
+        self.assertEqual(caching.get_metrics(['test'])['test']['waits'], 1)
+
+    def test_metrics_are_restricted_to_staff(self):
+        url = reverse('main:cache_metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        user = User.objects.create_user('membre', 'membre@exemple.com', 'motdepasse')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        User.objects.filter(pk=user.pk).update(is_staff=True)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('site_statistics', response.json()['metrics'])
+
+
+class OnboardingTests(TestCase):
+    """Inscription d'un utilisateur (profil, badge, activité, notification)"""
+
+    def setUp(self):
+        SiteStatistics.objects.create(pk=SiteStatistics.SINGLETON_ID)
+
+    def test_signup_query_count(self):
+        # INSERT user, INSERT profil, UPDATE statistiques (rôle), INSERT journal
+        # des points, INSERT badge, INSERT activité, INSERT notification,
+        # UPDATE dons et inscriptions MBC (rattachement), UPDATE statistiques
+        # (utilisateurs)
+        with self.assertNumQueries(10):
+            user = User.objects.create_user('nouveau', 'nouveau@exemple.com', 'motdepasse')
+
+        profile = UserProfile.objects.get(user=user)
+        self.assertEqual(profile.points, 50)
+        self.assertEqual(list(user.points_ledger.values_list('points', 'reason')), [(50, 'welcome')])
+        self.assertEqual(profile.get_badges_list(), ['new_member'])
+        self.assertEqual(UserActivity.objects.filter(user=user, activity_type='registration').count(), 1)
+        self.assertEqual(UserNotification.objects.filter(user=user).count(), 1)
+
+        statistics = SiteStatistics.objects.get()
+        self.assertEqual(statistics.total_users, 1)
+        self.assertEqual(statistics.families_supported, 1)
+
+
+class UnreadNotificationsTests(TestCase):
+    """Compteur de notifications non lues et badge de la barre de navigation"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('lecteur', 'lecteur@exemple.com', 'motdepasse')
+        UserNotification.objects.create(user=self.user, title='Info', message='Message')
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+
+    def test_counter_follows_create_and_read(self):
+        self.assertEqual(UserProfile.objects.get(user=self.user).unread_notifications, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(mark_all_read(self.user), 2)
+        self.assertEqual(UserProfile.objects.get(user=self.user).unread_notifications, 0)
+        self.assertEqual(unread_notifications(self.request), {'unread_notifications_count': 0})
+
+    def test_write_during_read_does_not_leave_stale_count(self):
+        load = notifications._load_count
+
+        def read_then_write(user_id):
+            count = load(user_id)
+            # Notification validée (et cache invalidé) avant que la lecture stocke sa valeur
+            with self.captureOnCommitCallbacks(execute=True):
+                UserNotification.objects.create(user=self.user, title='Nouvelle', message='Message')
+            return count
+
+        with mock.patch.object(notifications, '_load_count', side_effect=read_then_write):
+            self.assertEqual(get_unread_count(self.user), 2)
+        self.assertEqual(get_unread_count(self.user), 3)
+
+    def test_context_processor_query_count(self):
+        unread_notifications(self.request)
+        with self.assertNumQueries(0):
+            context = unread_notifications(self.request)
+        self.assertEqual(context, {'unread_notifications_count': 2})
+
+
+class ProfilePointsTests(TestCase):
+    """Points et niveau : UPDATE atomiques, non écrasés par une sauvegarde complète"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('joueur', 'joueur@exemple.com', 'motdepasse')
+
+    def test_full_save_keeps_concurrent_points(self):
+        stale = UserProfile.objects.get(user=self.user)
+        UserProfile.objects.get(user=self.user).add_points(100)
+        stale.phone = '0810000000'
+        stale.save()
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual((profile.points, profile.level, profile.phone), (150, 2, '0810000000'))
+
+    def test_full_save_writes_edited_points(self):
+        profile = UserProfile.objects.get(user=self.user)
+        profile.points = 10
+        profile.save()
+        self.assertEqual(UserProfile.objects.get(user=self.user).points, 10)
+
+
+class ImpactOutboxTests(TestCase):
+    """Projection des sources sur ImpactPoint par l'outbox"""
+
+    def setUp(self):
+        SiteStatistics.objects.create(pk=SiteStatistics.SINGLETON_ID)
+        self.donation = Donation.objects.create(donor_name='A', donor_email='a@exemple.com', amount=1000, status='completed')
+
+    def test_drain_projects_and_empties_outbox(self):
+        self.assertEqual(ImpactOutbox.objects.count(), 1)
+        self.assertFalse(ImpactPoint.objects.exists())
+
+        self.assertEqual(impact_projection.drain_outbox(), (1, 0))
+        point = ImpactPoint.objects.get(related_model='Donation', related_id=self.donation.pk)
+        self.assertEqual(point.value, 1000)
+        self.assertFalse(ImpactOutbox.objects.exists())
+
+    def test_only_projected_changes_are_enqueued(self):
+        impact_projection.drain_outbox()
+        self.donation.save()
+        self.assertFalse(ImpactOutbox.objects.exists())
+
+        self.donation.status = 'refunded'
+        self.donation.save()
+        self.assertEqual(impact_projection.drain_outbox(), (1, 0))
+        self.assertFalse(ImpactPoint.objects.exists())
+
+    def test_failed_projection_is_retried_later(self):
+        with mock.patch.object(impact_projection, 'project', side_effect=RuntimeError('panne')), \
+                self.assertLogs('main.impact_projection', 'ERROR'):
+            self.assertEqual(impact_projection.drain_outbox(), (0, 1))
+        entry = ImpactOutbox.objects.get()
+        self.assertEqual(entry.attempts, 1)
+        self.assertIn('panne', entry.last_error)
+        self.assertGreater(entry.available_at, timezone.now())
+
+        # Pas encore disponible : ni traitée ni comptée en échec
+        self.assertEqual(impact_projection.drain_outbox(), (0, 0))
+        ImpactOutbox.objects.update(available_at=timezone.now())
+        self.assertEqual(impact_projection.drain_outbox(), (1, 0))
+        self.assertTrue(ImpactPoint.objects.filter(related_id=self.donation.pk).exists())
+
+    def test_failing_source_does_not_fail_its_group(self):
+        other = Donation.objects.create(donor_name='B', donor_email='b@exemple.com', amount=500, status='completed')
+        project = impact_projection.project
+
+        def failing_project(model, ids, **kwargs):
+            if self.donation.pk in ids:
+                raise RuntimeError('source fautive')
+            return project(model, ids, **kwargs)
+
+        with mock.patch.object(impact_projection, 'project', side_effect=failing_project), \
+                self.assertLogs('main.impact_projection', 'ERROR'):
+            self.assertEqual(impact_projection.drain_outbox(), (1, 1))
+        self.assertTrue(ImpactPoint.objects.filter(related_id=other.pk).exists())
+        entry = ImpactOutbox.objects.get()
+        self.assertEqual((entry.source_id, entry.attempts), (self.donation.pk, 1))
+
+
+class ImpactProjectionTests(TestCase):
+    """Projection ensembliste après des écritures en masse (sans signaux)"""
+
+    def setUp(self):
+        SiteStatistics.objects.create(pk=SiteStatistics.SINGLETON_ID)
+        Donation.objects.bulk_create([
+            Donation(donor_name='A', donor_email='a@exemple.com', amount=1000, status='completed'),
+            Donation(donor_name='B', donor_email='b@exemple.com', amount=500, status='pending'),
+            Donation(donor_name='C', donor_email='c@exemple.com', amount=200, status='completed'),
+        ])
+
+    def test_project_queryset_is_idempotent(self):
+        self.assertFalse(ImpactPoint.objects.exists())
+        self.assertEqual(impact_projection.project_queryset(Donation.objects.all(), batch_size=2), 2)
+        self.assertEqual(
+            sorted(ImpactPoint.objects.values_list('value', flat=True)), [Decimal('200'), Decimal('1000')]
+        )
+        self.assertEqual(impact_projection.project_queryset(Donation.objects.all()), 0)
+
+    def test_project_range_removes_orphans(self):
+        impact_projection.project_queryset(Donation.objects.all())
+        Donation.objects.filter(donor_name='C').update(status='refunded')
+        Donation.objects.filter(donor_name='A').delete()
+
+        self.assertEqual(impact_projection.project_range(Donation, 0), 2)
+        self.assertFalse(ImpactPoint.objects.exists())
+
+
+class ImpactMapTests(TestCase):
+    """Carte d'impact publique et ses API"""
+
+    def setUp(self):
+        SiteStatistics.objects.create(pk=SiteStatistics.SINGLETON_ID)
+
+    def test_map_page_does_not_inject_point_text(self):
+        ImpactPoint.objects.create(
+            type='donation', latitude=Decimal('-4.3317'), longitude=Decimal('15.3139'),
+            description='</script><script>alert(1)</script>',
+        )
+        response = self.client.get(reverse('main:interactive_map'))
+        self.assertNotContains(response, '</script><script>alert(1)')
+        self.assertContains(response, '<script id="recent-impacts" type="application/json">')
+
+    def test_export_is_modified_by_a_deletion(self):
+        cache.clear()
+        point = self._point(description='remboursé')
+        ImpactPoint.objects.filter(pk=point.pk).update(updated_at=timezone.now() - timedelta(hours=2))
+        url = reverse('main:api_impact_export')
+        with mock.patch('main.impact_map.timezone.now', return_value=timezone.now() - timedelta(hours=1)):
+            last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            point.delete()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('remboursé', b''.join(response.streaming_content).decode())
+
+    def _point(self, **fields):
+        return ImpactPoint.objects.create(
+            type='donation', latitude=Decimal('-4.3317'), longitude=Decimal('15.3139'), **fields
+        )
+
+    def test_changes_feed_delivers_late_committed_points(self):
+        start = impact_map.current_cursor()
+        first = self._point(description='premier')
+        points, cursor, has_more = impact_map.get_changes_since(start)
+        self.assertEqual([point.pk for point in points], [first.pk])
+        self.assertFalse(has_more)
+
+        # Daté avant `first` (updated_at fixé avant le commit) mais validé après sa lecture
+        late = self._point(description='tardif')
+        ImpactPoint.objects.filter(pk=late.pk).update(updated_at=first.updated_at - timedelta(seconds=1))
+        points, cursor, has_more = impact_map.get_changes_since(cursor)
+        self.assertEqual([point.pk for point in points], [late.pk, first.pk])
+
+    def test_changes_feed_cursor_passes_settled_points(self):
+        old = self._point(description='ancien')
+        ImpactPoint.objects.filter(pk=old.pk).update(
+            updated_at=timezone.now() - 2 * impact_map.CHANGES_SAFETY_WINDOW
+        )
+        cursor = impact_map.encode_cursor(timezone.now() - timedelta(days=1), 0)
+        points, cursor, has_more = impact_map.get_changes_since(cursor)
+        self.assertEqual([point.pk for point in points], [old.pk])
+        self.assertEqual(impact_map.get_changes_since(cursor)[0], [])
+
+
+class ImpactImportTests(TestCase):
+    """API d'import en lot de points d'impact"""
+
+    def setUp(self):
+        SiteStatistics.objects.create(pk=SiteStatistics.SINGLETON_ID)
+        self.url = reverse('main:api_add_impact')
+        self.user = User.objects.create_user('partenaire', 'partenaire@exemple.com', 'motdepasse')
+        self.user.user_permissions.add(Permission.objects.get(codename='add_impactpoint'))
+        self.client.force_login(self.user)
+
+    def _row(self, **fields):
+        return dict({'type': 'donation', 'latitude': '-4.3317', 'longitude': '15.3139', 'description': 'Don'}, **fields)
+
+    def _post(self, body, content_type='application/json'):
+        return self.client.post(self.url, body if isinstance(body, str) else json.dumps(body), content_type=content_type)
+
+    def test_anonymous_gets_401(self):
+        self.client.logout()
+        response = self._post([self._row()])
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['status'], 'error')
+
+    def test_missing_permission_gets_403(self):
+        self.client.force_login(User.objects.create_user('membre', 'membre@exemple.com', 'motdepasse'))
+        self.assertEqual(self._post([self._row()]).status_code, 403)
+        self.assertFalse(ImpactPoint.objects.exists())
+
+    def test_json_array(self):
+        response = self._post([self._row(), self._row(description='Atelier')])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'status': 'success', 'created': 2, 'errors': []})
+        self.assertEqual(ImpactPoint.objects.exclude(geohash='').count(), 2)
+
+    def test_single_object(self):
+        response = self._post(self._row())
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 1)
+
+    def test_ndjson(self):
+        body = '\n'.join([json.dumps(self._row()), '', 'pas du json', json.dumps(self._row())])
+        response = self._post(body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data['created'], 2)
+        self.assertEqual([error['row'] for error in data['errors']], [2])
+
+    def test_invalid_rows_are_reported(self):
+        response = self._post([self._row(), self._row(latitude='200'), 5])
+        data = response.json()
+        self.assertEqual((response.status_code, data['status'], data['created']), (201, 'success', 1))
+        self.assertEqual([error['row'] for error in data['errors']], [2, 3])
+        self.assertIn('latitude', data['errors'][0]['errors'])
+        self.assertEqual(data['errors'][1]['errors'], {'__all__': ['Objet JSON attendu']})
+
+    def test_non_list_body_gets_400(self):
+        self.assertEqual(self._post('"texte"').status_code, 400)
+        self.assertEqual(self._post('{pas du json').status_code, 400)
+
+    def test_failed_chunk_is_reported(self):
+        with mock.patch.object(ImpactPoint.objects, 'bulk_create', side_effect=DatabaseError('panne')), \
+                self.assertLogs('main.impact_map', 'ERROR'):
+            response = self._post([self._row(), self._row()])
+        data = response.json()
+        self.assertEqual((response.status_code, data['status'], data['created']), (200, 'error', 0))
+        self.assertEqual(data['errors'], [
+            {'row': 1, 'errors': {'__all__': ['panne']}},
+            {'row': 2, 'errors': {'__all__': ['panne']}},
+        ])
+        self.assertFalse(ImpactPoint.objects.exists())
+
+
+class LeaderboardTests(TestCase):
+    """Rangs pré-calculés (ex aequo au même rang) et leurs mises à jour"""
+
+    def setUp(self):
+        self.profiles = []
+        for name, points in [('a', 300), ('b', 200), ('c', 200), ('d', 100)]:
+            user = User.objects.create_user(name, f'{name}@exemple.com', 'motdepasse')
+            UserProfile.objects.filter(user=user).update(points=points)
+            self.profiles.append(UserProfile.objects.get(user=user))
+        leaderboard.refresh_ranks()
+
+    def ranks(self):
+        return dict(LeaderboardRank.objects.values_list('profile__user__username', 'rank'))
+
+    def test_ties_share_rank(self):
+        self.assertEqual(self.ranks(), {'a': 1, 'b': 2, 'c': 2, 'd': 4})
+
+    def test_points_change_shifts_ranks(self):
+        self.profiles[3].add_points(150)  # 250 points : dépasse b et c
+        self.assertEqual(self.ranks(), {'a': 1, 'd': 2, 'b': 3, 'c': 3})
+        self.profiles[3].add_points(50)  # 300 points : ex aequo avec a
+        self.assertEqual(self.ranks(), {'a': 1, 'd': 1, 'b': 3, 'c': 3})
+
+    def test_deleted_profile_shifts_lower_ranks(self):
+        self.profiles[1].user.delete()
+        self.assertEqual(self.ranks(), {'a': 1, 'c': 2, 'd': 3})
+        self.profiles[0].user.delete()
+        self.assertEqual(self.ranks(), {'c': 1, 'd': 2})
+
+    def test_get_rank_without_neighbours(self):
+        with self.assertNumQueries(1):
+            ranking = leaderboard.get_rank(self.profiles[2], neighbours=0)
+        self.assertEqual(ranking, {'rank': 2, 'neighbours': []})
+        neighbours = leaderboard.get_rank(self.profiles[2], neighbours=1)['neighbours']
+        self.assertEqual([entry.rank for entry in neighbours], [1, 2, 2])
+
+
+class BadgeRulesTests(TestCase):
+    """Attribution des badges par règles, pour les utilisateurs en file"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('donateur', 'donateur@exemple.com', 'motdepasse')
+
+    def donate(self, status='completed'):
+        return Donation.objects.create(
+            donor_name='D', donor_email='donateur@exemple.com', amount=1000, status=status, user=self.user
+        )
+
+    def badges(self):
+        return set(self.user.user_badges.values_list('badge', flat=True))
+
+    def test_pending_donation_completed_later(self):
+        donation = self.donate(status='pending')
+        self.assertEqual(badge_rules.evaluate_rules(), {})
+
+        donation.status = 'completed'
+        donation.save()
+        self.assertEqual(badge_rules.evaluate_rules(), {'first_donation': 1})
+        self.assertIn('first_donation', self.badges())
+        self.assertEqual(UserNotification.objects.filter(user=self.user, notification_type='badge').count(), 1)
+        self.assertEqual(UserProfile.objects.get(user=self.user).unread_notifications, 2)
+        self.assertFalse(BadgeCheck.objects.exists())
+
+    def test_count_rule_and_no_double_award(self):
+        for _ in range(6):
+            self.donate()
+        self.assertEqual(badge_rules.evaluate_rules(), {'first_donation': 1, 'generous_donor': 1})
+        self.donate()
+        self.assertEqual(badge_rules.evaluate_rules(), {})
+
+    def test_activity_and_profile_rules(self):
+        UserActivity.objects.create(user=self.user, activity_type='event_participation', description='Atelier')
+        UserProfile.objects.filter(user=self.user).update(role='volunteer')
+        self.assertEqual(badge_rules.evaluate_rules(), {'event_participant': 1, 'volunteer': 1})
+
+    def test_check_written_during_a_pass_stays_queued(self):
+        self.donate()
+        other = User.objects.create_user('autre', 'autre@exemple.com', 'motdepasse')
+        apply_rules = badge_rules._apply_rules
+
+        def apply_and_queue(rules, user_ids, awarded):
+            # Ligne validée pendant le passage, après la lecture du lot
+            badge_rules.queue_checks([other.pk])
+            apply_rules(rules, user_ids, awarded)
+
+        with mock.patch.object(badge_rules, '_apply_rules', side_effect=apply_and_queue):
+            badge_rules.evaluate_rules()
+        self.assertEqual(list(BadgeCheck.objects.values_list('user_id', flat=True)), [other.pk])
+
+    def test_full_evaluation_ignores_queue(self):
+        Donation.objects.bulk_create([Donation(
+            donor_name='D', donor_email='donateur@exemple.com', amount=1000, status='completed', user=self.user
+        )])
+        self.assertEqual(badge_rules.evaluate_rules(), {})
+        self.assertEqual(badge_rules.evaluate_rules(full=True), {'first_donation': 1})
+
+
+class PointsRollupTests(TestCase):
+    """Totaux de la semaine et du mois agrégés depuis le journal des points"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', 'alice@exemple.com', 'motdepasse')
+        self.bob = User.objects.create_user('bob', 'bob@exemple.com', 'motdepasse')
+
+    def totals(self, period):
+        return dict(
+            PointsPeriodTotal.objects.filter(period=period, period_start=leaderboard.period_start(period))
+            .values_list('user__username', 'points')
+        )
+
+    def test_rollup_counts_each_row_once(self):
+        UserProfile.objects.get(user=self.bob).add_points(30, reason='event_registration')
+        # Points de bienvenue (2 x 50) et ajout de bob
+        self.assertEqual(leaderboard.rollup_points(batch_size=2), 3)
+        self.assertEqual(self.totals('week'), {'alice': 50, 'bob': 80})
+        self.assertEqual(self.totals('month'), {'alice': 50, 'bob': 80})
+        self.assertFalse(PointsLedger.objects.filter(rolled_up=False).exists())
+
+        self.assertEqual(leaderboard.rollup_points(), 0)
+        self.assertEqual(self.totals('week'), {'alice': 50, 'bob': 80})
+        self.assertEqual([row.user for row in leaderboard.get_period_leaderboard('week')], [self.bob, self.alice])
+
+    def test_row_committed_after_a_later_id_is_counted(self):
+        late = PointsLedger.objects.create(user=self.alice, points=20)
+        PointsLedger.objects.create(user=self.bob, points=5)
+        # Lignes d'id supérieur déjà agrégées pendant que `late` n'était pas validée
+        PointsLedger.objects.exclude(pk=late.pk).update(rolled_up=True)
+
+        self.assertEqual(leaderboard.rollup_points(), 1)
+        self.assertEqual(self.totals('week'), {'alice': 20})
+
+    def test_previous_week_is_kept_apart(self):
+        last_week = timezone.now() - timedelta(days=7)
+        PointsLedger.objects.filter(user=self.alice).update(created_at=last_week)
+        leaderboard.rollup_points()
+        self.assertEqual(self.totals('week'), {'bob': 50})
+        self.assertEqual(
+            PointsPeriodTotal.objects.get(period='week', period_start=leaderboard.period_start('week', last_week)).points,
+            50,
+        )
+
+
+class AccountLinkingTests(TestCase):
+    """Rattachement des dons et inscriptions MBC au compte de même email"""
+
+    def setUp(self):
+        self.donation = Donation.objects.create(
+            donor_name='D', donor_email='donateur@exemple.com', amount=1000, status='completed'
+        )
+        mbc = MutotoBikeChallenge.objects.create(
+            name='MBC', slug='mbc', description='MBC', date=timezone.now(), location='Kinshasa'
+        )
+        self.participant = MBCParticipant.objects.create(
+            event=mbc, participant_name='P', participant_email='donateur@exemple.com', participant_phone='0',
+            age=10, emergency_contact='C', emergency_phone='0', status='confirmed'
+        )
+
+    def test_signup_links_earlier_rows(self):
+        user = User.objects.create_user('donateur', 'donateur@exemple.com', 'motdepasse')
+        self.donation.refresh_from_db()
+        self.participant.refresh_from_db()
+        self.assertEqual((self.donation.user, self.participant.user), (user, user))
+        self.assertEqual(list(BadgeCheck.objects.values_list('user_id', flat=True)), [user.pk])
+
+    def test_shared_email_is_not_linked(self):
+        User.objects.create_user('premier', 'donateur@exemple.com', 'motdepasse')
+        Donation.objects.filter(pk=self.donation.pk).update(user=None)
+        User.objects.create_user('second', 'donateur@exemple.com', 'motdepasse')
+        call_command('link_user_accounts', stdout=StringIO())
+        self.donation.refresh_from_db()
+        self.assertIsNone(self.donation.user)
+
+    def test_command_links_rows_after_email_change(self):
+        user = User.objects.create_user('donateur', 'ancien@exemple.com', 'motdepasse')
+        self.assertIsNone(Donation.objects.get(pk=self.donation.pk).user)
+        User.objects.filter(pk=user.pk).update(email='donateur@exemple.com')
+
+        call_command('link_user_accounts', batch_size=1, stdout=StringIO())
+        self.assertEqual(Donation.objects.get(pk=self.donation.pk).user, user)
+        self.assertEqual(MBCParticipant.objects.get(pk=self.participant.pk).user, user)
+
+
+class KeysetPaginationTests(TestCase):
+    """Pagination par clé (date, id) des listes du tableau de bord"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('lecteur', 'lecteur@exemple.com', 'motdepasse')
+        UserNotification.objects.filter(user=self.user).delete()
+        now = timezone.now()
+        for i in range(5):
+            notification = UserNotification.objects.create(user=self.user, title=f'N{i}', message='M')
+            # N3 et N4 à la même date : départagées par l'id
+            UserNotification.objects.filter(pk=notification.pk).update(created_at=now - timedelta(minutes=min(i, 3)))
+        self.paginator = KeysetPaginator(UserNotification.objects.filter(user=self.user), per_page=2)
+
+    def test_pages_follow_date_then_id(self):
+        expected = list(
+            UserNotification.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('title', flat=True)
+        )
+        self.assertEqual(expected, ['N0', 'N1', 'N2', 'N4', 'N3'])
+        titles, cursor = [], None
+        while True:
+            page = self.paginator.page(cursor)
+            titles.extend(notification.title for notification in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(titles, expected)
+        self.assertEqual(self.paginator.approximate_count(), (5, True))
+        self.assertEqual(self.paginator.approximate_count(limit=3), (3, False))
+
+    def test_invalid_cursor(self):
+        for cursor in ['pas-un-curseur', 'WzEsIDJd', 'WyJ4IiwgMV0']:
+            with self.assertRaises(InvalidCursor):
+                self.paginator.page(cursor)
+        self.assertEqual(len(self.paginator.get_page('pas-un-curseur')), 2)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('main:load_more_notifications'), {'cursor': 'pas-un-curseur'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('main:load_more_notifications'), {'total': 1})
+        self.assertEqual(response.json()['total'], 5)
+
+
+class BroadcastTests(TestCase):
+    """Diffusion d'une notification à un segment, par lots"""
+
+    def setUp(self):
+        self.volunteers = []
+        for i in range(5):
+            user = User.objects.create_user(f'benevole{i}', f'benevole{i}@exemple.com', 'motdepasse')
+            UserProfile.objects.filter(user=user).update(role='volunteer')
+            self.volunteers.append(user)
+        User.objects.create_user('membre', 'membre@exemple.com', 'motdepasse')
+        self.broadcast = broadcasts.create_broadcast('Collecte', 'Rendez-vous samedi', role='volunteer')
+
+    def received(self):
+        return UserNotification.objects.filter(title='Collecte').order_by('user_id').values_list('user_id', flat=True)
+
+    def test_send_to_segment_once(self):
+        self.assertEqual(self.broadcast.total_recipients, 5)
+        self.assertFalse(broadcasts.queue_broadcast(self.broadcast))
+
+        self.assertEqual(broadcasts.send_broadcast(self.broadcast, chunk_size=2), 5)
+        self.assertEqual(list(self.received()), [user.pk for user in self.volunteers])
+        self.assertEqual(UserProfile.objects.get(user=self.volunteers[0]).unread_notifications, 2)
+        broadcast = NotificationBroadcast.objects.get()
+        self.assertEqual((broadcast.status, broadcast.sent_count, broadcast.progress), ('sent', 5, 100))
+
+        self.assertEqual(broadcasts.send_broadcast(self.broadcast, chunk_size=2), 0)
+        self.assertEqual(self.received().count(), 5)
+
+    def test_interrupted_send_resumes_after_last_chunk(self):
+        adjust = broadcasts.adjust_unread_count
+        calls = []
+
+        def fail_on_second_chunk(user_ids, delta):
+            calls.append(user_ids)
+            if len(calls) == 2:
+                raise RuntimeError('coupure')
+            adjust(user_ids, delta)
+
+        with mock.patch.object(broadcasts, 'adjust_unread_count', side_effect=fail_on_second_chunk), \
+                self.assertLogs('main.broadcasts', 'ERROR'):
+            self.assertEqual(broadcasts.send_pending_broadcasts(chunk_size=2), 0)
+        broadcast = NotificationBroadcast.objects.get()
+        self.assertEqual((broadcast.status, broadcast.sent_count), ('sending', 2))
+        self.assertEqual(self.received().count(), 2)
+
+        self.assertEqual(broadcasts.send_pending_broadcasts(chunk_size=2), 3)
+        self.assertEqual(list(self.received()), [user.pk for user in self.volunteers])
+        self.assertEqual(NotificationBroadcast.objects.get().status, 'sent')
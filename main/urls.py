@@ -42,10 +42,14 @@ urlpatterns = [
     
     # AJAX
     path('newsletter/subscribe/', views.newsletter_subscribe, name='newsletter_subscribe'),
+    path('api/cache-metrics/', views.cache_metrics, name='cache_metrics'),
     
     # Carte Interactive d'Impact Social
     path('impact-map/', map_views.InteractiveMapView.as_view(), name='interactive_map'),
     path('api/impact-data/', map_views.get_impact_data, name='api_impact_data'),
+    path('api/impact-clusters/', map_views.impact_clusters, name='api_impact_clusters'),
+    path('api/impact-tiles/<int:z>/<int:x>/<int:y>.json', map_views.impact_tile, name='api_impact_tile'),
+    path('api/impact-export.geojson', map_views.export_impact_geojson, name='api_impact_export'),
     path('api/add-impact/', map_views.add_impact_point, name='api_add_impact'),
     path('dashboard/gamification/', map_views.gamification_dashboard, name='gamification_dashboard'),
     
@@ -58,6 +62,9 @@ urlpatterns = [
     path('dashboard/badges/', dashboard_views.dashboard_badges, name='dashboard_badges'),
     path('dashboard/settings/', dashboard_views.dashboard_settings, name='dashboard_settings'),
     path('dashboard/activities/', dashboard_views.dashboard_activities, name='dashboard_activities'),
+    path('dashboard/donations/more/', dashboard_views.load_more_donations, name='load_more_donations'),
+    path('dashboard/notifications/more/', dashboard_views.load_more_notifications, name='load_more_notifications'),
+    path('dashboard/activities/more/', dashboard_views.load_more_activities, name='load_more_activities'),
     
     # Actions dashboard
     path('dashboard/join-event/<int:event_id>/', dashboard_views.join_event, name='join_event'),
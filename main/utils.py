@@ -1,87 +1,230 @@
+from django.conf import settings
 from django.db.models import Sum, Count, Q
 from django.contrib.auth.models import User
 from .models import (
     Donation, MBCParticipant, Event, Project, UserProfile, 
-    EventParticipation, StaffContribution, ImpactPoint
+    EventParticipation, StaffContribution, ImpactPoint, SiteStatistics
 )
+from .caching import get_or_refresh
 
-def get_site_statistics():
+SITE_STATISTICS_CACHE_KEY = 'site_statistics'
+
+# Contribution d'une ligne aux compteurs additifs de SiteStatistics.
+# Les signaux appliquent contribution(après) - contribution(avant).
+STATISTICS_RULES = {
+    Donation: lambda v: {
+        'total_donations': v['amount'] if v['status'] == 'completed' else 0,
+    },
+    UserProfile: lambda v: {
+        'total_profiles': 1,
+        'children_profiles': int(v['role'] == 'child'),
+        'families_supported': int(v['role'] in ('parent', 'member')),
+        'total_volunteers': int(v['role'] == 'volunteer'),
+    },
+    MBCParticipant: lambda v: {
+        'mbc_participants': int(v['status'] == 'confirmed'),
+    },
+    Project: lambda v: {
+        'active_projects': int(v['status'] == 'active'),
+    },
+    Event: lambda v: {
+        'all_events': 1,
+        'total_events': int(v['is_active']),
+        'formations_dispensed': int(v['is_active'] and v['event_type'] == 'workshop'),
+    },
+    StaffContribution: lambda v: {
+        'staff_contributions': v['amount'] if v['is_recorded'] else 0,
+    },
+    EventParticipation: lambda v: {
+        'event_participations': int(v['status'] in ('confirmed', 'attended')),
+    },
+}
+
+# Compteurs de valeurs distinctes (non vides) d'une colonne indexée. Une
+# ligne ajoute 1 quand elle apporte une valeur qu'aucune autre ne porte et
+# retire 1 quand elle emporte la dernière : un EXISTS, pas de recomptage.
+DISTINCT_STATISTICS = {
+    Donation: {'total_donors': 'donor_email'},
+    UserProfile: {'user_locations': 'geohash'},
+    ImpactPoint: {'impact_locations': 'geohash'},
+}
+
+
+def distinct_value_delta(instance, field, before, after):
     """
-    Calcule et retourne toutes les statistiques dynamiques du site
-    basées sur les vraies données de la base de données
+    Variation du nombre de valeurs distinctes de `field` quand la ligne
+    `instance` passe de la valeur `before` à `after` (None : absente ou vide)
     """
+    if before == after:
+        return 0
+    others = type(instance).objects.exclude(pk=instance.pk)
+    delta = 0
+    if after is not None and not others.filter(**{field: after}).exists():
+        delta += 1
+    if before is not None and not others.filter(**{field: before}).exists():
+        delta -= 1
+    return delta
+
+
+def count_statistic(name):
+    """Recompter un compteur non additif de SiteStatistics"""
+    if name == 'total_donors':
+        return Donation.objects.exclude(donor_email='').values('donor_email').distinct().count()
+    if name == 'user_locations':
+        return UserProfile.objects.exclude(geohash='').values('geohash').distinct().count()
+    if name == 'impact_locations':
+        return ImpactPoint.objects.exclude(geohash='').values('geohash').distinct().count()
+    if name == 'total_users':
+        return User.objects.filter(is_active=True).count()
+    raise ValueError(f"Compteur inconnu : {name}")
+
+
+def compute_site_counters():
+    """
+    Calcule les compteurs bruts directement depuis la base de données
+    (utilisé pour construire et vérifier l'instantané SiteStatistics).
+    Agrégation conditionnelle : une seule requête par table.
+    """
+    # 1. FC collectés (dons complétés) et donateurs distincts
+    donations = Donation.objects.aggregate(
+        total=Sum('amount', filter=Q(status='completed')),
+        donors=Count('donor_email', distinct=True, filter=~Q(donor_email='')),
+    )
     
-    # 1. FC collectés (total des dons complétés)
-    total_donations = Donation.objects.filter(
-        status='completed'
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    # 2. Enfants aidés (utilisateurs avec le rôle 'child' + participants MBC confirmés)
-    children_helped = UserProfile.objects.filter(role='child').count()
-    confirmed_mbc_participants = MBCParticipant.objects.filter(status='confirmed').count()
-    # Total unique d'enfants aidés
-    total_children_helped = children_helped + confirmed_mbc_participants
-    
-    # 3. Projets actifs
-    active_projects = Project.objects.filter(status='active').count()
-    
-    # 4. Événements (total de tous les événements organisés)
-    total_events = Event.objects.filter(is_active=True).count()
-    
-    # 5. Formations dispensées (événements de type workshop)
-    formations_dispensed = Event.objects.filter(
-        event_type='workshop',
-        is_active=True
-    ).count()
-    
-    # 6. Familles soutenues (utilisateurs avec le rôle 'parent' ou ayant des enfants)
-    families_supported = UserProfile.objects.filter(
-        Q(role='parent') | Q(role='member')
-    ).count()
-    
-    # 7. Participants MBC (total confirmés)
-    mbc_participants = confirmed_mbc_participants
+    # 2. Utilisateurs actifs et rôles des profils (jointure 1-1 User/UserProfile)
+    profiles = User.objects.aggregate(
+        active=Count('id', filter=Q(is_active=True)),
+        profiles=Count('userprofile'),
+        # Enfants aidés (rôle 'child')
+        children=Count('userprofile', filter=Q(userprofile__role='child')),
+        # Familles soutenues (rôle 'parent' ou 'member')
+        families=Count('userprofile', filter=Q(userprofile__role__in=['parent', 'member'])),
+        volunteers=Count('userprofile', filter=Q(userprofile__role='volunteer')),
+        locations=Count('userprofile__geohash', distinct=True, filter=~Q(userprofile__geohash='')),
+    )
     
-    # 8. Quartiers impactés (nombre de zones géographiques distinctes)
-    # Basé sur les coordonnées GPS des utilisateurs et des points d'impact
-    user_locations = UserProfile.objects.filter(
-        latitude__isnull=False,
-        longitude__isnull=False
-    ).values('latitude', 'longitude').distinct().count()
+    # 3. Participants MBC confirmés
+    mbc = MBCParticipant.objects.aggregate(confirmed=Count('id', filter=Q(status='confirmed')))
     
-    impact_locations = ImpactPoint.objects.filter(
-        latitude__isnull=False,
-        longitude__isnull=False
-    ).values('latitude', 'longitude').distinct().count()
+    # 4. Projets actifs
+    projects = Project.objects.aggregate(active=Count('id', filter=Q(status='active')))
     
-    quartiers_impacted = max(user_locations + impact_locations, 25)  # Minimum 25 pour refléter l'activité réelle
+    # 5. Événements (tous et actifs), formations (workshops) et participations confirmées
+    events = Event.objects.aggregate(
+        all=Count('id', distinct=True),
+        active=Count('id', distinct=True, filter=Q(is_active=True)),
+        workshops=Count('id', distinct=True, filter=Q(is_active=True, event_type='workshop')),
+        participations=Count(
+            'eventparticipation',
+            filter=Q(eventparticipation__status__in=['confirmed', 'attended']),
+        ),
+    )
     
-    # 9. Contributions du staff (total)
-    staff_contributions = StaffContribution.objects.filter(
-        is_recorded=True
-    ).aggregate(total=Sum('amount'))['total'] or 0
+    # 6. Quartiers impactés : cellules geohash distinctes des points d'impact
+    impacts = ImpactPoint.objects.aggregate(
+        locations=Count('geohash', distinct=True, filter=~Q(geohash='')),
+    )
     
-    # 10. Total des participations aux événements
-    event_participations = EventParticipation.objects.filter(
-        status__in=['confirmed', 'attended']
-    ).count()
+    # 7. Contributions du staff enregistrées
+    staff = StaffContribution.objects.aggregate(total=Sum('amount', filter=Q(is_recorded=True)))
     
     return {
-        'total_donations': int(total_donations),
-        'total_children_helped': total_children_helped,
-        'active_projects': active_projects,
-        'total_events': total_events,
-        'formations_dispensed': formations_dispensed,
-        'families_supported': families_supported,
-        'mbc_participants': mbc_participants,
-        'quartiers_impacted': quartiers_impacted,
-        'staff_contributions': int(staff_contributions),
-        'event_participations': event_participations,
+        'total_donations': donations['total'] or 0,
+        'children_profiles': profiles['children'],
+        'mbc_participants': mbc['confirmed'],
+        'active_projects': projects['active'],
+        'total_events': events['active'],
+        'formations_dispensed': events['workshops'],
+        'families_supported': profiles['families'],
+        'user_locations': profiles['locations'],
+        'impact_locations': impacts['locations'],
+        'staff_contributions': staff['total'] or 0,
+        'event_participations': events['participations'],
+        'total_users': profiles['active'],
+        'total_volunteers': profiles['volunteers'],
+        'total_donors': donations['donors'],
+        'total_profiles': profiles['profiles'],
+        'all_events': events['all'],
+    }
+
+
+def build_site_statistics(counters):
+    """Transforme les compteurs bruts en statistiques affichées sur le site"""
+    return {
+        'total_donations': int(counters['total_donations']),
+        'total_children_helped': counters['children_profiles'] + counters['mbc_participants'],
+        'active_projects': counters['active_projects'],
+        'total_events': counters['total_events'],
+        'formations_dispensed': counters['formations_dispensed'],
+        'families_supported': counters['families_supported'],
+        'mbc_participants': counters['mbc_participants'],
+        # Minimum 25 pour refléter l'activité réelle
+        'quartiers_impacted': max(counters['user_locations'] + counters['impact_locations'], 25),
+        'staff_contributions': int(counters['staff_contributions']),
+        'event_participations': counters['event_participations'],
         
         # Statistiques supplémentaires
-        'total_users': User.objects.filter(is_active=True).count(),
-        'total_volunteers': UserProfile.objects.filter(role='volunteer').count(),
-        'total_donors': Donation.objects.values('donor_email').distinct().count(),
+        'total_users': counters['total_users'],
+        'total_volunteers': counters['total_volunteers'],
+        'total_donors': counters['total_donors'],
+        'total_profiles': counters['total_profiles'],
+        'all_events': counters['all_events'],
+    }
+
+
+def rebuild_site_statistics():
+    """
+    Recalcule l'instantané SiteStatistics depuis zéro.
+    Retourne les écarts constatés {compteur: (instantané, réel)}.
+    """
+    counters = compute_site_counters()
+    snapshot, created = SiteStatistics.objects.get_or_create(
+        pk=SiteStatistics.SINGLETON_ID, defaults=counters
+    )
+    if created:
+        return {}
+    drift = {
+        name: (getattr(snapshot, name), value)
+        for name, value in counters.items()
+        if getattr(snapshot, name) != value
+    }
+    if drift:
+        SiteStatistics.set_counters(counters)
+    return drift
+
+
+def get_site_statistics():
+    """
+    Retourne toutes les statistiques dynamiques du site à partir de
+    l'instantané SiteStatistics (une seule ligne lue)
+    """
+    snapshot = SiteStatistics.objects.filter(pk=SiteStatistics.SINGLETON_ID).first()
+    if snapshot is None:
+        rebuild_site_statistics()
+        snapshot = SiteStatistics.objects.get(pk=SiteStatistics.SINGLETON_ID)
+    return build_site_statistics(snapshot.counters())
+
+def get_cached_site_statistics():
+    """
+    Statistiques du site servies par le cache stale-while-revalidate
+    (page d'accueil, carte interactive, vue de test)
+    """
+    return get_or_refresh(
+        SITE_STATISTICS_CACHE_KEY,
+        get_site_statistics,
+        ttl=getattr(settings, 'SITE_STATISTICS_CACHE_TTL', 300),
+    )
+
+def get_map_statistics():
+    """Statistiques affichées en tête de la carte interactive"""
+    site_stats = get_cached_site_statistics()
+    return {
+        # Définitions historiques de la carte : tous les profils, tous les événements
+        'total_beneficiaries': site_stats['total_profiles'],
+        'total_events': site_stats['all_events'],
+        'total_donations': site_stats['total_donations'],
+        'active_projects': site_stats['active_projects'],
+        'volunteers': site_stats['total_volunteers'],
     }
 
 def format_number(number):
@@ -94,3 +237,13 @@ def format_number(number):
         return f"{number/1000:.0f} {number%1000:03d}".replace(" 000", " 000")
     else:
         return str(number)
+
+def account_ids_by_email(emails):
+    """
+    Comptes correspondant aux adresses `emails`, sous la forme {email: id}.
+    Une adresse partagée par plusieurs comptes n'est rattachée à aucun.
+    """
+    accounts = {}
+    for email, user_id in User.objects.filter(email__in=set(emails) - {''}).values_list('email', 'id'):
+        accounts[email] = None if email in accounts else user_id
+    return {email: user_id for email, user_id in accounts.items() if user_id is not None}
@@ -3,6 +3,7 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.core.paginator import Paginator
+from django.db import transaction
 from django.db.models import Q, Sum
 from django.utils import timezone
 from django.core.mail import send_mail
@@ -16,7 +17,10 @@ from .models import (
     MutoScienceAdventure, ChatConversation, ChatMessage, User
 )
 from .forms import ContactForm, NewsletterForm, MBCRegistrationForm, DonationForm
-from .utils import get_site_statistics
+from .utils import SITE_STATISTICS_CACHE_KEY, account_ids_by_email, get_cached_site_statistics
+from .caching import get_metrics
+from .dashboard_cache import UPCOMING_CACHE_KEY
+from .impact_projection import outbox_lag
 
 def home(request):
     """Page d'accueil AIME"""
@@ -32,7 +36,7 @@ def home(request):
     ).first()
     
     # Statistiques dynamiques basées sur la vraie base de données
-    stats = get_site_statistics()
+    stats = get_cached_site_statistics()
     
     context = {
         'title': 'Agissons Ici et Maintenant pour les Enfants',
@@ -125,6 +129,12 @@ def mutoto_bike_challenge(request):
     }
     return render(request, 'main/mbc.html', context)
 
+def _account_id(request, email):
+    """Compte à rattacher à un don ou une inscription : l'utilisateur connecté, sinon celui de l'email"""
+    if request.user.is_authenticated:
+        return request.user.pk
+    return account_ids_by_email([email]).get(email)
+
 def mbc_registration(request):
     """Inscription au Mutoto Bike Challenge"""
     current_event = MutotoBikeChallenge.objects.filter(
@@ -141,6 +151,7 @@ def mbc_registration(request):
         if form.is_valid():
             participant = form.save(commit=False)
             participant.event = current_event
+            participant.user_id = _account_id(request, participant.participant_email)
             participant.save()
             messages.success(
                 request, 
@@ -218,7 +229,10 @@ def donate(request, project_slug=None):
             donation = form.save(commit=False)
             if project:
                 donation.project = project
-            donation.save()
+            donation.user_id = _account_id(request, donation.donor_email)
+            # post_save (outbox de la carte, badges) écrit dans la même transaction
+            with transaction.atomic():
+                donation.save()
             messages.success(
                 request,
                 "Votre don a été enregistré! "
@@ -261,11 +275,20 @@ def newsletter_subscribe(request):
     
     return JsonResponse({'success': False, 'message': 'Erreur lors de l\'abonnement.'})
 
+# Clés du cache stale-while-revalidate exposées par /api/cache-metrics/
+CACHE_METRIC_KEYS = [SITE_STATISTICS_CACHE_KEY, UPCOMING_CACHE_KEY]
+
+def cache_metrics(request):
+    """Compteurs du cache (hits, misses, rafraîchissements) et retard de l'outbox pour la supervision (staff)"""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'message': 'Accès réservé au personnel autorisé.'}, status=403)
+    return JsonResponse({'success': True, 'metrics': get_metrics(CACHE_METRIC_KEYS), 'impact_outbox': outbox_lag()})
+
 @login_required
 def dashboard(request):
     """Dashboard utilisateur"""
     user_donations = Donation.objects.filter(
-        donor_email=request.user.email
+        user=request.user
     ).order_by('-created_at')[:5]
     
     user_messages = ContactMessage.objects.filter(
@@ -21,6 +21,9 @@ python3 manage.py collectstatic --noinput >> $LOG_FILE 2>&1
 # Appliquer les migrations
 python3 manage.py migrate --noinput >> $LOG_FILE 2>&1
 
+# Installer les tâches planifiées (outbox, classements, badges, diffusions)
+bash install-cron.sh "$(pwd)" "$(command -v python3)" >> $LOG_FILE 2>&1
+
 # Redémarrer l'application
 touch tmp/restart.txt
 